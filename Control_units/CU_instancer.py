@@ -4,40 +4,125 @@
 # - 2025-07-22: Corrected the MQTT configuration fetching to be robust.
 # - 2025-07-22: Ensured notify dispatcher correctly parses topics and finds controllers.
 # - 2025-07-23: Added the missing get_mqtt_config() function.
+# - 2026-10-19: Messages are now dispatched on a per-unit ordered worker pool instead of paho's network thread.
+# - 2026-10-19: Topics are routed through the shared TopicRouter instead of being split on every message.
+# - 2026-10-19: Added the "partition" cluster mode so several CU processes can split the houses between them.
+# - 2026-10-19: Commands published while the broker is down are spooled to disk and sent when it is back.
+# - 2026-10-19: The controllers share a DeviceDirectory, refreshed from the house list fetched for rebalancing.
+# - 2026-10-19: The controllers share one CatalogStatusWriter that batches their status updates.
+# - 2026-10-19: Each rebalance hands the units' automationRules from the catalog to their controllers.
+# - 2026-10-19: All controllers schedule their timers on one shared TimerService.
+# - 2026-10-19: Units are assigned to controllers with a consistent hash ring and their state moves with them.
+# - 2026-10-19: Rebalancing now runs every PERIODIC_UPDATE_INTERVAL seconds instead of once.
+# - 2026-10-19: Controllers share a CommandPipeline; actuator state topics are routed back to them.
+# - 2026-10-19: Unit state is checkpointed to disk and restored on startup (warm restart).
+# - 2026-10-19: Controllers run a vectorized sweep of the default rules every SWEEP_INTERVAL seconds and after a restore.
+# - 2026-10-19: Per-stage, per-house latency histograms, served on http://<host>:8090/metrics.
+# - 2026-10-19: The spool is named after an instance slot (or CU_ID) instead of the hostname.
+# - 2026-10-19: So is the checkpoint.
+# - 2026-10-19: In partition mode the first rebalance waits for the cluster membership to settle.
+# - 2026-10-19: No sweep right after a restore: no reading has arrived yet, the periodic sweep catches up.
 
 import requests
 import time
 import json
 import math
 import threading
+import os
+import socket
+import cherrypy
 from control_unit import Controler
-from MyMQTT2 import MyMQTT
+from MyMQTT2 import MyMQTT, message_timing
+from topic_router import TopicRouter
+from cluster import ClusterMembership
+from device_directory import DeviceDirectory, unit_key
+from hash_ring import HashRing
+from catalog_writer import CatalogStatusWriter
+from timer_service import TimerService
+from command_pipeline import CommandPipeline
+from checkpoint import save_checkpoint, load_checkpoint
+from latency_metrics import LatencyMetrics, MetricsEndpoint, senml_time
+from instance_slot import claim_instance_id
 
 class CU_instancer():
     def __init__(self, catalogAddress):
         self.catalogAddress = catalogAddress.rstrip('/')
         self.PERIODIC_UPDATE_INTERVAL = 60
         self.NUM_UNITS_PER_CONTROLLER = 5
+        # Controllers do blocking catalog calls, so they must not run on paho's network thread
+        self.DISPATCH_WORKERS = 4
+        self.DISPATCH_QUEUE_SIZE = 1000
+        self.DISPATCH_BACKPRESSURE = "shed_telemetry"
+        # Threads running the controllers' timer jobs, whatever the number of controllers
+        self.TIMER_WORKERS = 2
+        self.CHECKPOINT_INTERVAL = 30
+        # Rules run on events; the sweep only catches units whose events were lost
+        self.SWEEP_INTERVAL = 60
+        self.METRICS_PORT = int(os.environ.get("CU_METRICS_PORT", 8090))
+        # Older checkpoint entries only keep the last motion; statuses come from the catalog and the state topics
+        self.CHECKPOINT_MAX_AGE = 300
+        # Names the spool and checkpoint this process keeps on disk. Container hostnames change when the
+        # container is recreated, so by default a numbered slot is claimed with a lock file.
+        if os.environ.get("CU_ID"):
+            self.CU_ID, self.instance_lock = os.environ["CU_ID"], None
+        else:
+            self.CU_ID, self.instance_lock = claim_instance_id("spool", "control_unit")
+        self.CHECKPOINT_PATH = os.environ.get("CU_CHECKPOINT_PATH", os.path.join("checkpoint", f"{self.CU_ID}.json"))
+        # "single": this process handles every house.
+        # "partition": houses are split over all CU processes running in partition mode.
+        self.CLUSTER_MODE = os.environ.get("CU_CLUSTER_MODE", "single")
 
         self.controllers = {}
         self.unit_assignment = {}
+        self.ring = HashRing()
+        self.subscribed_topics = set()
+        self.cluster = None
+        self.rebalance_lock = threading.Lock()
+        self.metrics = LatencyMetrics("control_unit")
+        self.directory = DeviceDirectory(self.catalogAddress)
+        self.writer = CatalogStatusWriter(self.catalogAddress, self.directory, metrics=self.metrics)
+        self.timers = TimerService(workers=self.TIMER_WORKERS)
+        self.commands = CommandPipeline(self.timers)
+        self.restored, self.restored_at = load_checkpoint(self.CHECKPOINT_PATH)
         
         try:
             # This call will now work because the function is defined below
             broker, port, main_topic = self.get_mqtt_config()
             self.main_topic = main_topic
-            client_id = f"CU_Instancer_{int(time.time())}"
-            self.client = MyMQTT(client_id, broker, port, self)
+            self.router = TopicRouter()
+            self.router.add_route(f"{main_topic}/sensors/+/+/+/+", self.on_sensor_message)
+            self.router.add_route(f"{main_topic}/state/+/+/+/+", self.on_state_message)
+            # The hostname keeps client IDs unique when several CU containers start in the same second
+            client_id = f"CU_Instancer_{socket.gethostname()}_{int(time.time())}"
+            self.client = MyMQTT(client_id, broker, port, self,
+                                 dispatch_workers=self.DISPATCH_WORKERS,
+                                 dispatch_queue_size=self.DISPATCH_QUEUE_SIZE,
+                                 backpressure=self.DISPATCH_BACKPRESSURE,
+                                 spool_dir=os.path.join("spool", self.CU_ID))
+            if self.CLUSTER_MODE == "partition":
+                # The spool slot: stable across restarts, so a restarted process takes its own place in
+                # the ring back, and distinct for processes sharing a host. Set CU_ID on multi-host setups.
+                self.cluster = ClusterMembership(self.CU_ID, self.client, main_topic,
+                                                 self.update_and_rebalance_controllers)
+                self.router.add_route(f"{self.cluster.members_topic}/+", self.cluster.on_member_message)
+                self.client.myWillSet(*self.cluster.will())
             self.client.start()
+            if self.cluster:
+                self.cluster.start()
+                print(f"[CLUSTER] Running in partition mode as member '{self.cluster.member_id}'")
         except Exception as e:
             print(f"[FATAL] Could not start MQTT client for instancer: {e}")
             return
-        
+
+        if self.cluster:
+            # Otherwise every starting process would briefly own, subscribe to and restore every house
+            self.cluster.wait_settled()
         self.update_and_rebalance_controllers()
         
-        self.scheduler = threading.Timer(self.PERIODIC_UPDATE_INTERVAL, self.update_and_rebalance_controllers)
-        self.scheduler.daemon = True
-        self.scheduler.start()
+        self.rebalance_job = self.timers.call_every(self.PERIODIC_UPDATE_INTERVAL, self.update_and_rebalance_controllers,
+                                                    name="rebalance")
+        self.checkpoint_job = self.timers.call_every(self.CHECKPOINT_INTERVAL, self.checkpoint, name="checkpoint")
+        self.sweep_job = self.timers.call_every(self.SWEEP_INTERVAL, self.sweep, name="sweep")
 
     def get_mqtt_config(self):
         """Fetches broker details and the main topic from the catalog."""
@@ -56,62 +141,214 @@ class CU_instancer():
         """This is the single entry point for all MQTT messages."""
         print(f"[DISPATCH] Received on topic: {topic}")
         try:
-            parts = topic.split("/")
-            if len(parts) < 5: return
-
-            unit_key_str = f"{parts[2]}-{parts[3]}-{parts[4]}"
-            assigned_controller_name = self.unit_assignment.get(unit_key_str)
-            
-            if assigned_controller_name:
-                controller = self.controllers.get(assigned_controller_name)
-                if controller:
-                    controller.process_message(topic, payload)
-                else:
-                    print(f"[WARN] No controller instance found for '{assigned_controller_name}'")
-            else:
-                print(f"[WARN] No controller assigned for unit '{unit_key_str}'")
+            self.router.dispatch(topic, payload)
         except Exception as e:
             print(f"[ERROR] Error in dispatcher notify(): {e}")
 
+    def on_sensor_message(self, key, payload):
+        """Forwards a sensor reading to the controller that owns its unit."""
+        assigned_controller_name = self.unit_assignment.get(key.unit_id)
+        if assigned_controller_name:
+            controller = self.controllers.get(assigned_controller_name)
+            if controller:
+                sensor_time = senml_time(payload)
+                received_at = getattr(message_timing, "received_at", None)
+                if received_at is not None:
+                    if sensor_time is not None:
+                        self.metrics.observe("broker_delivery", key.house, received_at - sensor_time)
+                    self.metrics.observe("dispatch_wait", key.house, message_timing.dequeued_at - received_at)
+                message_timing.sensor_time = sensor_time
+                try:
+                    controller.process_message(key, payload)
+                finally:
+                    message_timing.sensor_time = None
+            else:
+                print(f"[WARN] No controller instance found for '{assigned_controller_name}'")
+        else:
+            print(f"[WARN] No controller assigned for unit '{key.unit_id}'")
+
+    def on_state_message(self, key, payload):
+        """Forwards the state an actuator reports to the controller of its unit."""
+        controller = self.controllers.get(self.unit_assignment.get(key.unit_id))
+        if controller:
+            status = payload.get("e", [{}])[0].get("v")
+            controller.on_device_state(key.unit_key, key.device, status)
+
+    def log_dispatch_stats(self):
+        client = getattr(self, "client", None)
+        stats = client.get_dispatch_stats() if client else {}
+        if stats:
+            print(f"[DISPATCH] depth={stats['depth']} max_depth={stats['max_depth']} "
+                  f"processed={stats['processed']} shed={stats['shed']} dropped={stats['dropped']} "
+                  f"blocked={stats['blocked']}")
+        spool = client.get_spool_stats() if client else {}
+        if any(queue["bytes"] for queue in spool.values()):
+            print(f"[SPOOL] Offline backlog: {spool}")
+        writer = self.writer.get_stats()
+        print(f"[CATALOG] written={writer['written']} coalesced={writer['coalesced']} pending={writer['pending']} "
+              f"retries={writer['retries']} failed={writer['failed']} not_found={writer['not_found']}")
+        commands = self.commands.get_stats()
+        print(f"[COMMANDS] sent={commands['sent']} suppressed={commands['suppressed']} coalesced={commands['coalesced']} "
+              f"rate_limited={commands['rate_limited']} inflight={commands['inflight']} confirmed={commands['confirmed']} "
+              f"expired={commands['expired']}")
+        for stage, (count, p50, p99) in self.metrics.summary().items():
+            print(f"[LATENCY] {stage}: n={count} p50<={p50 * 1000:g}ms p99<={p99 * 1000:g}ms")
+        timers = self.timers.get_stats()
+        print(f"[TIMERS] pending={timers['pending']} ran={timers['ran']} failed={timers['failed']} "
+              f"late_avg={timers['late_avg'] * 1000:.1f}ms late_max={timers['late_max'] * 1000:.1f}ms "
+              f"threads={threading.active_count()}")
+
+    def owns_house(self, houseID):
+        return self.cluster is None or self.cluster.owns(houseID)
+
+    def sync_subscriptions(self, houses):
+        """Subscribes to the sensor and actuator state topics of the houses this process owns, and drops the others."""
+        if self.cluster is None:
+            wanted = {f"{self.main_topic}/{kind}/#" for kind in ("sensors", "state")}
+        else:
+            wanted = {f"{self.main_topic}/{kind}/{house['houseID']}/#"
+                      for house in houses if self.owns_house(house['houseID']) for kind in ("sensors", "state")}
+
+        for topic in sorted(wanted - self.subscribed_topics):
+            self.client.mySubscribe(topic)
+            print(f"[SUBSCRIBE] Instancer subscribed to: {topic}")
+        for topic in sorted(self.subscribed_topics - wanted):
+            self.client.unsubscribe(topic)
+            print(f"[SUBSCRIBE] Instancer released: {topic}")
+        self.subscribed_topics = wanted
+
+    def checkpoint(self):
+        units = {}
+        for controller in list(self.controllers.values()):
+            for key, state in controller.snapshot().items():
+                units["-".join(str(p) for p in key)] = state
+        try:
+            save_checkpoint(self.CHECKPOINT_PATH, units)
+        except OSError as e:
+            print(f"[ERROR] Failed to write checkpoint {self.CHECKPOINT_PATH}: {e}")
+
+    def sweep(self):
+        sent = sum(controller.sweep() for controller in list(self.controllers.values()))
+        if sent:
+            print(f"[SWEEP] {sent} commands from the periodic rule sweep")
+
+    def restore_units(self, houses):
+        """
+        Hands the state saved before the last restart to the controllers, once.
+        Device statuses of entries older than CHECKPOINT_MAX_AGE are replaced by
+        the catalog's; the retained state topics correct them again on subscribe.
+        """
+        if not self.restored:
+            return
+        start = time.time()
+        catalog_status = {}
+        for house in houses:
+            for floor in house.get("floors", []):
+                for unit in floor.get("units", []):
+                    uid = f"{house['houseID']}-{floor['floorID']}-{unit['unitID']}"
+                    catalog_status[uid] = {d["deviceName"]: d.get("deviceStatus") for d in unit.get("devicesList", [])
+                                           if d.get("deviceName")}
+
+        restored = stale = 0
+        for uid, state in self.restored.items():
+            controller = self.controllers.get(self.unit_assignment.get(uid))
+            if controller is None:
+                continue
+            if start - (state.get("updated") or self.restored_at) > self.CHECKPOINT_MAX_AGE:
+                state = {"last_motion": state.get("last_motion"), "device_status": catalog_status.get(uid)}
+                stale += 1
+            key = unit_key(*uid.split("-"))
+            controller.import_unit(key, state)
+            for device_name, status in (state.get("device_status") or {}).items():
+                if status is not None:
+                    self.commands.seed(key, device_name, status)
+            restored += 1
+        self.restored = {}
+        print(f"[RESTORE] {restored} units restored from checkpoint ({stale} reconciled with the catalog) "
+              f"in {(time.time() - start) * 1000:.0f} ms")
+
+    def apply_rules(self, unit_rules):
+        for uid, definitions in unit_rules.items():
+            controller = self.controllers.get(self.unit_assignment.get(uid))
+            if controller:
+                controller.set_unit_rules(unit_key(*uid.split("-")), definitions)
+
     def update_and_rebalance_controllers(self):
+        with self.rebalance_lock:
+            self._rebalance()
+
+    def _rebalance(self):
         print("[INFO] Checking for unit updates and rebalancing controllers...")
         try:
             resp = requests.get(f"{self.catalogAddress}/houses", timeout=5)
             resp.raise_for_status()
             houses = resp.json()
+            self.directory.refresh(houses)
             
             current_units = set()
+            unit_rules = {}
             for house in houses:
+                if not self.owns_house(house['houseID']):
+                    continue
                 for floor in house.get("floors", []):
                     for unit in floor.get("units", []):
                         uid = f"{house['houseID']}-{floor['floorID']}-{unit['unitID']}"
                         current_units.add(uid)
+                        # Unit rules override the house rules; neither means the built-in defaults
+                        unit_rules[uid] = unit.get("automationRules", house.get("automationRules"))
 
             if set(self.unit_assignment.keys()) == current_units and self.controllers:
                 print("[INFO] No change in units. No rebalance needed.")
+                self.apply_rules(unit_rules)
+                self.sync_subscriptions(houses)
                 return
 
             print("[INFO] Unit list has changed. Rebalancing controllers.")
-            availableUnitsList = sorted(list(current_units))
 
-            needed_controllers = math.ceil(len(availableUnitsList) / self.NUM_UNITS_PER_CONTROLLER)
+            # Units that moved to another CU process must not keep issuing commands from here
+            for uid in set(self.unit_assignment) - current_units:
+                controller = self.controllers.get(self.unit_assignment.pop(uid))
+                if controller:
+                    controller.forget_unit(unit_key(*uid.split("-")))
+                self.commands.forget(unit_key(*uid.split("-")))
+
+            needed_controllers = max(1, math.ceil(len(current_units) / self.NUM_UNITS_PER_CONTROLLER))
             for i in range(needed_controllers):
                 name = f"controller_{i}"
                 if name not in self.controllers:
-                    self.controllers[name] = Controler(self.catalogAddress, self.client, self.main_topic)
+                    self.controllers[name] = Controler(self.catalogAddress, self.client, self.main_topic,
+                                                      self.directory, self.writer, self.timers, self.commands,
+                                                      self.metrics)
                     print(f"[INIT] Created {name}")
+                self.ring.add(name)
+            retired = [name for name in self.controllers if int(name.rsplit("_", 1)[1]) >= needed_controllers]
+            for name in retired:
+                self.ring.remove(name)
 
-            self.unit_assignment.clear()
-            for idx, unit in enumerate(availableUnitsList):
-                controller_idx = idx // self.NUM_UNITS_PER_CONTROLLER
-                assigned_controller = f"controller_{controller_idx}"
-                self.unit_assignment[unit] = assigned_controller
-            
-            print(f"[REBALANCE] Unit assignment updated: {self.unit_assignment}")
-            
-            topic_to_subscribe = f"{self.main_topic}/sensors/#"
-            self.client.mySubscribe(topic_to_subscribe)
-            print(f"[SUBSCRIBE] Instancer subscribed to master topic: {topic_to_subscribe}")
+            # On the hash ring a new or retired controller only moves about 1/N of the units
+            moved = 0
+            for uid in sorted(current_units):
+                new_name = self.ring.get(uid)
+                old_name = self.unit_assignment.get(uid)
+                if old_name == new_name:
+                    continue
+                # Route new messages to the new controller first, then move what the old one knew
+                self.unit_assignment[uid] = new_name
+                if old_name in self.controllers:
+                    key = unit_key(*uid.split("-"))
+                    self.controllers[new_name].import_unit(key, self.controllers[old_name].export_unit(key))
+                    moved += 1
+
+            for name in retired:
+                self.controllers.pop(name).stop()
+                print(f"[INIT] Retired {name}")
+
+            print(f"[REBALANCE] {len(current_units)} units on {len(self.controllers)} controllers, "
+                  f"{moved} moved to another controller")
+            self.apply_rules(unit_rules)
+            self.restore_units(houses)
+            # Subscribing last: retained state messages must find their unit already assigned
+            self.sync_subscriptions(houses)
 
         except Exception as e:
             print(f"[ERROR] Failed during rebalance: {e}")
@@ -121,8 +358,24 @@ if __name__ == "__main__":
     # When running in Docker, this connects to the 'catalog' service
     catalogAddress = "http://catalog:8080/"
     cu_instancer = CU_instancer(catalogAddress)
+    cherrypy.tree.mount(MetricsEndpoint(cu_instancer.metrics), '/metrics', {
+        '/': {'request.dispatch': cherrypy.dispatch.MethodDispatcher()}
+    })
+    cherrypy.config.update({
+        'server.socket_host': '0.0.0.0',
+        'server.socket_port': cu_instancer.METRICS_PORT,
+        'log.screen': False,
+    })
+    cherrypy.engine.start()
     try:
         while True:
             time.sleep(10)
+            cu_instancer.log_dispatch_stats()
     except KeyboardInterrupt:
-        print("\n[EXIT] Shutting down...")
\ No newline at end of file
+        print("\n[EXIT] Shutting down...")
+        if cu_instancer.cluster:
+            cu_instancer.cluster.stop()
+        cu_instancer.checkpoint()
+        cu_instancer.writer.stop()
+        cu_instancer.timers.stop()
+        cherrypy.engine.exit()
\ No newline at end of file
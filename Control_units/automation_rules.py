@@ -0,0 +1,193 @@
+# changelog:
+# - 2026-10-19: Created. Declarative per-unit automation rules, compiled into predicates indexed by input.
+
+import json
+import time
+import datetime
+
+# Inputs a rule can be re-evaluated on besides sensor names
+TIMER_INPUT = "timer"
+
+OPERATORS = {
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+
+# The behaviour the control unit had before rules were configurable
+DEFAULT_RULES = [
+    {
+        "id": "motion_on",
+        "when": [{"event": "motion_sensor", "value": "Detected"}],
+        "then": {"device": "light_switch", "command": "ON"},
+        "reason": "Motion Detected",
+    },
+    {
+        "id": "low_light_on",
+        "when": [{"sensor": "light_sensor", "op": "<", "value": 380},
+                 {"device": "light_switch", "op": "!=", "value": "ON"}],
+        "then": {"device": "light_switch", "command": "ON"},
+        "reason": "Low Light Level",
+    },
+    {
+        "id": "bright_idle_off",
+        "when": [{"sensor": "light_sensor", "op": ">", "value": 420, "default": 1000},
+                 {"noMotionFor": 30},
+                 {"device": "light_switch", "op": "==", "value": "ON"}],
+        "then": {"device": "light_switch", "command": "OFF"},
+        "reason": "Auto-Off: Bright & No Motion",
+    },
+]
+
+
+class RuleError(ValueError):
+    pass
+
+
+class UnitContext:
+    """What a predicate can see of a unit while one input is being handled."""
+    __slots__ = ("readings", "devices", "last_motion", "event", "now")
+
+    def __init__(self, readings, devices, last_motion, event=None, now=None):
+        self.readings = readings
+        self.devices = devices
+        self.last_motion = last_motion
+        self.event = event  # (sensor, value) of the message being handled, None for timers
+        self.now = now if now is not None else time.time()
+
+
+class CompiledRule:
+    __slots__ = ("id", "predicate", "device", "command", "reason", "inputs", "motion_timeouts")
+
+    def __init__(self, rule_id, predicate, device, command, reason, inputs, motion_timeouts=()):
+        self.id = rule_id
+        self.predicate = predicate
+        self.device = device
+        self.command = command
+        self.reason = reason
+        self.inputs = inputs
+        self.motion_timeouts = motion_timeouts
+
+
+class RuleSet:
+    """
+    Compiled rules of a unit. `by_input` maps an input (a sensor name or
+    TIMER_INPUT) to the rules that depend on it, in definition order, so an
+    event only re-evaluates the rules it can change.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.by_input = {}
+        for rule in rules:
+            for name in rule.inputs:
+                self.by_input.setdefault(name, []).append(rule)
+        # Delays after a motion at which the TIMER_INPUT rules must be re-evaluated
+        self.motion_timeouts = sorted({t for rule in rules for t in rule.motion_timeouts})
+
+    def evaluate(self, input_name, ctx):
+        """Rules triggered by `input_name` whose conditions hold: the first one per device, in definition order."""
+        fired = {}
+        for rule in self.by_input.get(input_name, ()):
+            if rule.device not in fired and rule.predicate(ctx):
+                fired[rule.device] = rule
+        return list(fired.values())
+
+
+def _parse_clock(value):
+    hours, minutes = value.split(":")
+    return datetime.time(int(hours), int(minutes))
+
+
+def _compile_condition(cond, inputs, timeouts):
+    if not isinstance(cond, dict):
+        raise RuleError(f"Condition must be an object, got {cond!r}")
+
+    if "event" in cond:
+        sensor, expected = cond["event"], cond.get("value")
+        inputs.add(sensor)
+        return lambda ctx: ctx.event is not None and ctx.event[0] == sensor and \
+            (expected is None or ctx.event[1] == expected)
+
+    if "sensor" in cond or "device" in cond:
+        op = OPERATORS.get(cond.get("op", "=="))
+        if op is None:
+            raise RuleError(f"Unknown operator {cond.get('op')!r}")
+        expected = cond.get("value")
+        if "sensor" in cond:
+            sensor, default = cond["sensor"], cond.get("default")
+            inputs.add(sensor)
+
+            def check_sensor(ctx):
+                value = ctx.readings.get(sensor, default)
+                if value is None:
+                    return False
+                try:
+                    return op(value, expected)
+                except TypeError:
+                    return False
+            return check_sensor
+        device = cond["device"]
+        return lambda ctx: op(ctx.devices.get(device), expected)
+
+    if "noMotionFor" in cond:
+        seconds = float(cond["noMotionFor"])
+        inputs.add(TIMER_INPUT)
+        timeouts.append(seconds)
+        return lambda ctx: ctx.now - ctx.last_motion >= seconds
+
+    if "between" in cond:
+        start, end = (_parse_clock(v) for v in cond["between"])
+        if start <= end:
+            return lambda ctx: start <= datetime.datetime.fromtimestamp(ctx.now).time() < end
+        # Window across midnight, e.g. 22:00-06:00
+        return lambda ctx: not (end <= datetime.datetime.fromtimestamp(ctx.now).time() < start)
+
+    raise RuleError(f"Unknown condition {cond!r}")
+
+
+def compile_rule(definition):
+    if not isinstance(definition, dict) or "then" not in definition:
+        raise RuleError(f"Rule must be an object with 'when' and 'then', got {definition!r}")
+    inputs, timeouts = set(), []
+    checks = [_compile_condition(cond, inputs, timeouts) for cond in definition.get("when", [])]
+    if not inputs:
+        raise RuleError(f"Rule {definition.get('id')!r} has no sensor, event or noMotionFor condition to trigger it")
+    # Event rules fire on their event only, not every time another reading of the unit changes
+    events = {cond["event"] for cond in definition.get("when", []) if "event" in cond}
+    if events:
+        inputs = events
+
+    def predicate(ctx):
+        for check in checks:
+            if not check(ctx):
+                return False
+        return True
+
+    then = definition["then"]
+    if not isinstance(then, dict) or "device" not in then or "command" not in then:
+        raise RuleError(f"Rule {definition.get('id')!r}: 'then' needs a device and a command")
+    return CompiledRule(definition.get("id"), predicate, then["device"], then["command"],
+                        definition.get("reason", definition.get("id", "")), frozenset(inputs),
+                        tuple(timeouts))
+
+
+_compiled = {}
+
+
+def compile_rules(definitions):
+    """
+    Compiles a list of rule definitions into a RuleSet. Identical definitions
+    are compiled once and shared between units. None gives DEFAULT_RULES.
+    """
+    if definitions is None:
+        definitions = DEFAULT_RULES
+    cache_key = json.dumps(definitions, sort_keys=True)
+    ruleset = _compiled.get(cache_key)
+    if ruleset is None:
+        ruleset = RuleSet([compile_rule(d) for d in definitions])
+        _compiled[cache_key] = ruleset
+    return ruleset
@@ -0,0 +1,76 @@
+# changelog:
+# - 2026-10-19: Created. Vectorized sweep of the default light rules over a UnitStateStore.
+# - 2026-10-19: Units without a light reading are skipped instead of being taken as bright.
+
+from automation_rules import DEFAULT_RULES
+from unit_state import SWITCH_CODES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def default_thresholds():
+    """The numbers of the sweepable default rules, read from DEFAULT_RULES so both stay in step."""
+    rules = {rule["id"]: rule for rule in DEFAULT_RULES}
+    on_light = rules["low_light_on"]["when"][0]
+    off_light = rules["bright_idle_off"]["when"][0]
+    return {
+        "on_below": on_light["value"],
+        "off_above": off_light["value"],
+        "motion_timeout": rules["bright_idle_off"]["when"][1]["noMotionFor"],
+    }
+
+
+THRESHOLDS = default_thresholds()
+
+
+def bulk_evaluate(store, now, use_numpy=True):
+    """
+    Evaluates the default low_light_on and bright_idle_off rules for every unit
+    of `store` at once. Returns (on_slots, off_slots): the slots of the units
+    whose light_switch must be turned ON / OFF. They are NumPy int arrays, or
+    lists when NumPy is not installed or use_numpy is False.
+
+    Units with no light reading yet are left alone. The event-driven rules
+    take a missing reading as bright, but right after a restart or a
+    rebalance no unit has a reading, and that would turn every light off.
+    """
+    if np is not None and use_numpy:
+        return _bulk_numpy(store, now)
+    return _bulk_scalar(store, now)
+
+
+def _bulk_numpy(store, now):
+    count = len(store.used)
+    if count == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    # Zero-copy views of the store's arrays; they must not outlive this call or the arrays cannot grow
+    used = np.frombuffer(store.used, dtype=np.int8, count=count).astype(bool)
+    light = np.frombuffer(store.light, dtype=np.float64, count=count)
+    last_motion = np.frombuffer(store.last_motion, dtype=np.float64, count=count)
+    switch = np.frombuffer(store.switch, dtype=np.int8, count=count)
+
+    is_on = switch == SWITCH_CODES["ON"]
+    # NaN (no reading yet) compares False, so such units match neither rule
+    on = used & ~is_on & (light < THRESHOLDS["on_below"])
+    off = used & is_on & (light > THRESHOLDS["off_above"]) & (now - last_motion >= THRESHOLDS["motion_timeout"])
+    return np.flatnonzero(on), np.flatnonzero(off)
+
+
+def _bulk_scalar(store, now):
+    on_slots, off_slots = [], []
+    switch_on = SWITCH_CODES["ON"]
+    on_below, off_above = THRESHOLDS["on_below"], THRESHOLDS["off_above"]
+    motion_timeout = THRESHOLDS["motion_timeout"]
+    for slot, (used, light, last_motion, switch) in enumerate(zip(store.used, store.light, store.last_motion,
+                                                                   store.switch)):
+        if not used:
+            continue
+        if switch != switch_on:
+            if light < on_below:
+                on_slots.append(slot)
+        elif light > off_above and now - last_motion >= motion_timeout:  # False for NaN
+                off_slots.append(slot)
+    return on_slots, off_slots
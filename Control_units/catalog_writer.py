@@ -0,0 +1,141 @@
+# changelog:
+# - 2026-10-19: Created. Background writer that batches device status updates to the catalog.
+# - 2026-10-19: Records the submit-to-written latency of each update as the catalog_write stage.
+# - 2026-10-19: A 400 or 404 answer is read as the final result of the batch, not retried.
+
+import time
+import threading
+import requests
+
+
+class CatalogStatusWriter:
+    """
+    Collects device status changes from the controllers and writes them to the
+    catalog from a background thread, so commands never wait on HTTP.
+
+    Updates are keyed by (unit key, deviceName): a newer status for a device that
+    is still waiting replaces the older one (counted as "coalesced"). Pending
+    updates are sent as one PATCH /devices every FLUSH_INTERVAL seconds, or as
+    soon as MAX_BATCH devices are waiting. A failed batch is put back and retried
+    with a growing delay; updates that fail MAX_RETRIES times are dropped.
+    """
+    FLUSH_INTERVAL = 0.5
+    MAX_BATCH = 100
+    MAX_RETRIES = 5
+    RETRY_DELAY = 1
+    MAX_RETRY_DELAY = 30
+
+    def __init__(self, catalogAddress, directory, flush_interval=None, max_batch=None, metrics=None):
+        self.catalogAddress = catalogAddress.rstrip('/')
+        self.directory = directory
+        self.metrics = metrics
+        self.flush_interval = flush_interval if flush_interval is not None else self.FLUSH_INTERVAL
+        self.max_batch = max_batch if max_batch is not None else self.MAX_BATCH
+
+        self.pending = {}
+        self.attempts = {}
+        self.retry_at = 0
+        self.cond = threading.Condition()
+        self.running = True
+        self.stats = {"submitted": 0, "coalesced": 0, "written": 0, "not_found": 0,
+                      "failed": 0, "retries": 0, "batches": 0}
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, device_name, status, reason):
+        with self.cond:
+            self.stats["submitted"] += 1
+            if (key, device_name) in self.pending:
+                self.stats["coalesced"] += 1
+            self.pending[(key, device_name)] = (status, reason, time.time())
+            if len(self.pending) >= self.max_batch:
+                self.cond.notify()
+
+    def get_stats(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats["pending"] = len(self.pending)
+            return stats
+
+    def stop(self, timeout=5):
+        """Writes what is still pending, then stops the thread."""
+        with self.cond:
+            self.running = False
+            self.retry_at = 0
+            self.cond.notify()
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                deadline = time.time() + self.flush_interval
+                while self.running:
+                    remaining = max(deadline, self.retry_at) - time.time()
+                    if remaining <= 0 or (len(self.pending) >= self.max_batch and time.time() >= self.retry_at):
+                        break
+                    self.cond.wait(remaining)
+                batch, self.pending = self.pending, {}
+                running = self.running
+            if batch:
+                self._flush(batch)
+            if not running:
+                return
+
+    def _flush(self, batch):
+        updates = []
+        ids = {}
+        for (key, device_name), (status, reason, _submitted_at) in batch.items():
+            device_id = self.directory.lookup(key, device_name)
+            if device_id is None:
+                with self.cond:
+                    self.stats["not_found"] += 1
+                continue
+            ids[str(device_id)] = (key, device_name)
+            updates.append({"deviceID": device_id, "deviceStatus": status, "lastCommandReason": reason})
+        if not updates:
+            return
+
+        try:
+            r = requests.patch(f"{self.catalogAddress}/devices", json=updates, timeout=5)
+            # 400 and 404 come with the per-device result: sending the batch again would not help
+            if r.status_code not in (400, 404):
+                r.raise_for_status()
+            result = r.json()
+        except Exception as e:
+            print(f"[ERROR] Failed to write {len(updates)} status updates to the catalog: {e}")
+            self._requeue(batch, ids.values())
+            return
+
+        with self.cond:
+            self.stats["batches"] += 1
+            self.stats["written"] += result.get("updated", 0)
+            self.stats["not_found"] += len(result.get("notFound", []))
+            self.stats["failed"] += len(result.get("errors", []))
+            for item in ids.values():
+                self.attempts.pop(item, None)
+            self.retry_at = 0
+        if self.metrics is not None:
+            now = time.time()
+            for item in ids.values():
+                self.metrics.observe("catalog_write", item[0][0], now - batch[item][2])
+        for error in result.get("errors", []):
+            print(f"[ERROR] Catalog rejected status update: {error}")
+
+    def _requeue(self, batch, items):
+        with self.cond:
+            retries = 0
+            for item in items:
+                attempts = self.attempts.get(item, 0) + 1
+                if attempts > self.MAX_RETRIES:
+                    self.attempts.pop(item, None)
+                    self.stats["failed"] += 1
+                    continue
+                self.attempts[item] = attempts
+                retries = max(retries, attempts)
+                # A newer status submitted meanwhile wins over the one being retried
+                if item not in self.pending:
+                    self.pending[item] = batch[item]
+                    self.stats["retries"] += 1
+            if retries:
+                self.retry_at = time.time() + min(self.RETRY_DELAY * 2 ** (retries - 1), self.MAX_RETRY_DELAY)
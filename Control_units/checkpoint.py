@@ -0,0 +1,41 @@
+# changelog:
+# - 2026-10-19: Created. Atomic on-disk checkpoint of the control unit's per-unit state.
+
+import os
+import json
+import time
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path, units):
+    """
+    Writes {unit_id: state} to `path`. The file is written next to the old one
+    and renamed over it, so a crash leaves either the old or the new checkpoint.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {"version": CHECKPOINT_VERSION, "saved_at": time.time(), "units": units}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """Returns ({unit_id: state}, saved_at), or ({}, 0) if there is no usable checkpoint."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}, 0
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Ignoring unreadable checkpoint {path}: {e}")
+        return {}, 0
+    if data.get("version") != CHECKPOINT_VERSION:
+        print(f"[WARN] Ignoring checkpoint {path} with version {data.get('version')}")
+        return {}, 0
+    return data.get("units", {}), data.get("saved_at", 0)
@@ -0,0 +1,134 @@
+# changelog:
+# - 2026-10-19: Created. Lets several CU processes split the houses between them.
+# - 2026-10-19: The retained topic of a member that leaves or is found dead is cleared.
+# - 2026-10-19: wait_settled() holds the first rebalance until the other members have been heard.
+
+import time
+import threading
+from hash_ring import HashRing
+
+
+class ClusterMembership:
+    """
+    Tracks the live CU processes and decides which houses this process owns.
+
+    Every member publishes a retained heartbeat on `<main_topic>/cu/members/<id>`
+    and registers a retained last will that marks it dead, so the broker
+    announces a crashed process to the others. Members whose heartbeat is older
+    than MEMBER_TIMEOUT are dropped as well. The retained topic of a member that
+    left or died is cleared, so the broker does not keep one per past process.
+    Houses are spread over the live members with a consistent hash ring, so
+    when a member joins or dies only the houses it gains or loses change hands.
+
+    A new process first hears of the others from their retained heartbeats,
+    after it has connected. Until wait_settled() returns it would believe it
+    owns every house, so membership changes are not reported before that.
+
+    Houses are the unit of partitioning because every topic of a unit lives
+    under its house, so an owner can subscribe to `sensors/<house>/#` and see
+    all the messages of its units and nothing else.
+    """
+    HEARTBEAT_INTERVAL = 5
+    MEMBER_TIMEOUT = 15
+
+    def __init__(self, member_id, client, main_topic, on_change):
+        self.member_id = member_id
+        self.client = client
+        self.members_topic = f"{main_topic}/cu/members"
+        self.on_change = on_change
+
+        self.lock = threading.Lock()
+        self.last_seen = {member_id: time.time()}
+        self.ring = HashRing([member_id])
+        self._running = threading.Event()
+        self.settled = threading.Event()
+
+    def member_topic(self, member_id):
+        return f"{self.members_topic}/{member_id}"
+
+    def will(self):
+        """(topic, payload) of the last will, to be registered before connecting."""
+        return self.member_topic(self.member_id), {"id": self.member_id, "alive": False}
+
+    def start(self):
+        self.client.mySubscribe(f"{self.members_topic}/+")
+        self._running.set()
+        self.thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self.thread.start()
+
+    def wait_settled(self, connect_timeout=60):
+        """
+        Blocks until the client is connected and one HEARTBEAT_INTERVAL has
+        passed, so the retained heartbeats and a fresh one from every live
+        member have arrived. Gives up waiting for the connection after
+        connect_timeout seconds; the periodic rebalance corrects things then.
+        """
+        deadline = time.time() + connect_timeout
+        while not self.client.is_connected() and time.time() < deadline:
+            time.sleep(0.5)
+        if self.client.is_connected():
+            time.sleep(self.HEARTBEAT_INTERVAL)
+        else:
+            print(f"[CLUSTER] Not connected after {connect_timeout} s, assigning houses without the other members")
+        self.settled.set()
+        print(f"[CLUSTER] Members: {self.members()}")
+
+    def stop(self):
+        self._running.clear()
+        topic, payload = self.will()
+        self.client.myPublish(topic, payload)
+        self.client.myClearRetained(topic)
+
+    def owns(self, houseID):
+        with self.lock:
+            return self.ring.get(str(houseID)) == self.member_id
+
+    def members(self):
+        with self.lock:
+            return sorted(self.ring.nodes)
+
+    def on_member_message(self, key, payload):
+        """Router handler for `<main_topic>/cu/members/+`."""
+        member_id = payload.get("id")
+        if not member_id or member_id == self.member_id:
+            return
+        dead = False
+        with self.lock:
+            if payload.get("alive") and time.time() - float(payload.get("t", 0)) < self.MEMBER_TIMEOUT:
+                self.last_seen[member_id] = time.time()
+                changed = member_id not in self.ring.nodes
+                self.ring.add(member_id)
+            else:
+                self.last_seen.pop(member_id, None)
+                changed = member_id in self.ring.nodes
+                self.ring.remove(member_id)
+                dead = True
+        if dead:
+            # Its last will, or a heartbeat left behind by a process that is gone
+            self.client.myClearRetained(self.member_topic(member_id))
+        if changed and self.settled.is_set():
+            print(f"[CLUSTER] Membership changed: {self.members()}")
+            self.on_change()
+
+    def _expire_members(self):
+        now = time.time()
+        with self.lock:
+            dead = [m for m, seen in self.last_seen.items()
+                    if m != self.member_id and now - seen > self.MEMBER_TIMEOUT]
+            for member_id in dead:
+                del self.last_seen[member_id]
+                self.ring.remove(member_id)
+        for member_id in dead:
+            self.client.myClearRetained(self.member_topic(member_id))
+        return dead
+
+    def _heartbeat_loop(self):
+        while self._running.is_set():
+            self.client.myPublish(self.member_topic(self.member_id),
+                                  {"id": self.member_id, "alive": True, "t": time.time()},
+                                  retain=True)
+            dead = self._expire_members()
+            if dead and self.settled.is_set():
+                print(f"[CLUSTER] Members timed out: {dead}. Taking over their houses where assigned.")
+                self.on_change()
+            time.sleep(self.HEARTBEAT_INTERVAL)
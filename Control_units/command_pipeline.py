@@ -0,0 +1,125 @@
+# changelog:
+# - 2026-10-19: Created. Deduplicating, rate-limited command pipeline between the controllers and MQTT.
+# - 2026-10-19: Added seed() to preload device states restored after a restart.
+
+import time
+import threading
+
+
+class CommandPipeline:
+    """
+    Decides whether a command a controller wants to send actually goes out.
+
+    Per (unit key, device) it tracks the state confirmed by the actuator on its
+    retained state topic, the command in flight (sent, not yet confirmed) and
+    the command held back by the rate limit. A command is:
+      - suppressed if it would not change the in-flight state, or the confirmed
+        state when nothing is in flight;
+      - held if the device got a command less than MIN_INTERVAL seconds ago.
+        A newer command replaces a held one ("coalesced") and the last one is
+        sent when the interval is over;
+      - otherwise sent through the `send` callback given to submit().
+    A command that is not confirmed within INFLIGHT_TIMEOUT seconds stops
+    counting as in flight, so it can be sent again.
+    """
+    MIN_INTERVAL = 1.0
+    INFLIGHT_TIMEOUT = 10.0
+
+    def __init__(self, timers, min_interval=None, inflight_timeout=None):
+        self.timers = timers
+        self.min_interval = min_interval if min_interval is not None else self.MIN_INTERVAL
+        self.inflight_timeout = inflight_timeout if inflight_timeout is not None else self.INFLIGHT_TIMEOUT
+        self.lock = threading.Lock()
+        self.confirmed = {}
+        self.inflight = {}
+        self.held = {}
+        self.last_sent = {}
+        self.stats = {"submitted": 0, "sent": 0, "suppressed": 0, "coalesced": 0,
+                      "rate_limited": 0, "confirmed": 0, "expired": 0}
+
+    def _expected_state(self, device_key, now):
+        """State the device will be in once everything already sent has been applied."""
+        inflight = self.inflight.get(device_key)
+        if inflight is not None:
+            if now - inflight[1] < self.inflight_timeout:
+                return inflight[0]
+            del self.inflight[device_key]
+            self.stats["expired"] += 1
+        return self.confirmed.get(device_key)
+
+    def submit(self, key, device_name, command, reason, send):
+        """
+        Sends `command` through send(key, device_name, command, reason) now,
+        later, or not at all. Returns True if it was sent now.
+        """
+        device_key = (key, device_name)
+        now = time.time()
+        with self.lock:
+            self.stats["submitted"] += 1
+            if command == self._expected_state(device_key, now):
+                self.stats["suppressed"] += 1
+                # The net effect of the held command and this one is no change
+                if self.held.pop(device_key, None) is not None:
+                    self.stats["coalesced"] += 1
+                return False
+
+            wait = self.last_sent.get(device_key, 0) + self.min_interval - now
+            if wait > 0:
+                if device_key in self.held:
+                    self.stats["coalesced"] += 1
+                else:
+                    self.stats["rate_limited"] += 1
+                    self.timers.call_later(wait, self._release, device_key, name="command_release")
+                self.held[device_key] = (command, reason, send)
+                return False
+
+            self._mark_sent(device_key, command, now)
+        send(key, device_name, command, reason)
+        return True
+
+    def _mark_sent(self, device_key, command, now):
+        self.inflight[device_key] = (command, now)
+        self.last_sent[device_key] = now
+        self.stats["sent"] += 1
+
+    def _release(self, device_key):
+        now = time.time()
+        with self.lock:
+            held = self.held.pop(device_key, None)
+            if held is None:
+                return
+            command, reason, send = held
+            if command == self._expected_state(device_key, now):
+                self.stats["suppressed"] += 1
+                return
+            self._mark_sent(device_key, command, now)
+        send(device_key[0], device_key[1], command, reason)
+
+    def on_state(self, key, device_name, state):
+        """State reported by the actuator. Confirms the in-flight command when it matches."""
+        device_key = (key, device_name)
+        with self.lock:
+            self.confirmed[device_key] = state
+            inflight = self.inflight.get(device_key)
+            if inflight is not None and inflight[0] == state:
+                del self.inflight[device_key]
+                self.stats["confirmed"] += 1
+
+    def seed(self, key, device_name, state):
+        """State known from a checkpoint or the catalog. Anything the actuator already reported wins."""
+        with self.lock:
+            self.confirmed.setdefault((key, device_name), state)
+
+    def forget(self, key):
+        """Drops everything known about the devices of a unit."""
+        with self.lock:
+            for table in (self.confirmed, self.inflight, self.held, self.last_sent):
+                for device_key in [k for k in table if k[0] == key]:
+                    del table[device_key]
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["inflight"] = len(self.inflight)
+            stats["held"] = len(self.held)
+        return stats
@@ -5,125 +5,227 @@
 # - 2025-07-28: Merged periodic checks into a single function.
 # - 2025-07-28: Added logic to turn lights ON when light is low, regardless of motion.
 # - 2025-07-28: Added a "reason" to every command for better UI feedback.
+# - 2026-10-19: process_message() now receives the pre-parsed TopicKey from the instancer's router.
+# - 2026-10-19: update_catalog() PATCHes one device found through the DeviceDirectory instead of walking /houses.
+# - 2026-10-19: update_catalog() hands the status to the CatalogStatusWriter instead of calling the catalog itself.
+# - 2026-10-19: Rules are evaluated when a reading arrives; motion timeouts live in a TimerWheel instead of a 15 s sweep.
+# - 2026-10-19: The lux threshold has hysteresis (ON below 380, OFF above 420) so lights do not flap around 400.
+# - 2026-10-19: The hard-coded scenarios are replaced by per-unit automation rules from the catalog (see automation_rules.py).
+# - 2026-10-19: The timer tick runs on the process-wide TimerService instead of a sched thread per controller.
+# - 2026-10-19: Added export_unit()/import_unit() so a unit's state follows it when it moves to another controller.
+# - 2026-10-19: Commands go through the CommandPipeline (dedup, rate limit, in-flight tracking); actuator state is fed back.
+# - 2026-10-19: Added snapshot() for checkpoints; units remember when they were last updated.
+# - 2026-10-19: Per-unit state moved from nested dicts to the columnar UnitStateStore.
+# - 2026-10-19: Added sweep(), a vectorized pass of the default light rules over all units (see bulk_rules.py).
+# - 2026-10-19: Command publishing and sensor-to-command latency are recorded in the optional LatencyMetrics.
+# - 2026-10-19: The catalog status is recorded before the command is published, not after.
+# - 2026-10-19: The rule_eval latency stage is recorded here, around the rule evaluation only.
 
 import json
 import time
-import sched
-import requests
 import copy
-from datetime import datetime
 import threading
+from device_directory import DeviceDirectory
+from catalog_writer import CatalogStatusWriter
+from timer_wheel import TimerWheel
+from timer_service import TimerService
+from command_pipeline import CommandPipeline
+from automation_rules import compile_rules, RuleError, UnitContext, TIMER_INPUT
+from unit_state import UnitStateStore, ReadingsView, DevicesView
+from bulk_rules import bulk_evaluate
+from MyMQTT2 import message_timing
 
 class Controler():
-    def __init__(self, catalogAddress, mqtt_client, main_topic):
+    TICK_INTERVAL = 1
+
+    def __init__(self, catalogAddress, mqtt_client, main_topic, directory=None, writer=None, timers=None,
+                 commands=None, metrics=None):
         self.catalogAddress = catalogAddress.rstrip('/')
         self.client = mqtt_client
         self.main_topic = main_topic
+        self.directory = directory if directory is not None else DeviceDirectory(self.catalogAddress)
+        self.writer = writer if writer is not None else CatalogStatusWriter(self.catalogAddress, self.directory)
         
-        self.device_status_cache = {}
-        self.last_motion_time = {}
-        self.latest_light_level = {}
+        self.state = UnitStateStore()
+        self.default_rules = compile_rules(None)
+        self.unit_rules = {}
+        # Dispatch workers and the timer thread both touch the unit state
+        self.lock = threading.RLock()
+        self.motion_timers = TimerWheel(tick=self.TICK_INTERVAL)
 
-        self.scheduler = sched.scheduler(time.time, time.sleep)
-        self.scheduler.enter(15, 1, self.check_environmental_conditions, ())
-        
-        self.thread = threading.Thread(target=self.scheduler.run)
-        self.thread.daemon = True
-        self.thread.start()
+        self.timers = timers if timers is not None else TimerService(workers=1)
+        self.commands = commands if commands is not None else CommandPipeline(self.timers)
+        self.metrics = metrics
+        self.tick_job = self.timers.call_every(self.TICK_INTERVAL, self.tick, name="controller_tick")
 
         self.msg_template = {
             "bn": None,
             "e": [{"n": "actuator", "u": "command", "t": None, "v": None}]
         }
 
-    def process_message(self, topic, payload):
+    def process_message(self, topic_key, payload):
         try:
-            parts = topic.split("/")
-            if len(parts) < 6: return
+            key = topic_key.unit_key
+            sensorType = topic_key.device
 
-            _, _, houseID, floorID, unitID, sensorType = parts[:6]
-            key = (int(houseID), int(floorID), int(unitID))
-            
             event = payload.get("e", [{}])[0]
             value = event.get("v")
 
-            if sensorType == "motion_sensor":
-                if value == "Detected":
-                    self.last_motion_time[key] = time.time()
+            with self.lock:
+                slot = self.state.slot(key)
+                self.state.set_reading(slot, sensorType, value)
+                self.state.updated[slot] = time.time()
+                if sensorType == "motion_sensor" and value == "Detected":
+                    self.state.last_motion[slot] = time.time()
                     print(f"[ALERT] Motion in {key[0]}/{key[1]}/{key[2]}")
-                    self.send_command(key, "light_switch", "ON", "Motion Detected")
-            elif sensorType == "light_sensor":
-                self.latest_light_level[key] = float(value)
+                    self.schedule_motion_timeout(key)
+                self.run_rules(key, sensorType, (sensorType, value))
 
         except Exception as e:
             print(f"[ERROR] Controller failed to process message: {e}")
 
-    def check_environmental_conditions(self):
-        now = time.time()
-        all_known_keys = set(self.latest_light_level.keys()) | set(self.device_status_cache.keys())
-
-        for key in all_known_keys:
-            light_level = self.latest_light_level.get(key, 1000)
-            last_motion = self.last_motion_time.get(key, 0)
-            is_light_on = self.device_status_cache.get(key, {}).get("light_switch") == "ON"
-
-            # SCENARIO 1: Turn light ON if it's dark
-            if not is_light_on and light_level < 400:
-                print(f"[ACTION] Low light in {key} -> Turn ON light")
-                self.send_command(key, "light_switch", "ON", "Low Light Level")
-                continue
-
-            # SCENARIO 2: Turn light OFF if no motion and bright
-            if is_light_on and (now - last_motion > 30):
-                if light_level > 400:
-                    print(f"[ACTION] No motion & bright in {key} -> Turn OFF light")
-                    self.send_command(key, "light_switch", "OFF", "Auto-Off: Bright & No Motion")
-                    if key in self.last_motion_time:
-                        del self.last_motion_time[key]
-        
-        self.scheduler.enter(15, 1, self.check_environmental_conditions, ())
+    def set_unit_rules(self, key, definitions):
+        """Compiles the unit's rule definitions from the catalog. None, or invalid rules, give the default rules."""
+        try:
+            ruleset = compile_rules(definitions)
+        except (RuleError, KeyError, TypeError, ValueError) as e:
+            print(f"[ERROR] Invalid automation rules for {key}, using the defaults: {e}")
+            ruleset = self.default_rules
+        with self.lock:
+            self.unit_rules[key] = ruleset
+
+    def forget_unit(self, key):
+        """Drops all state of a unit that is no longer handled by this controller."""
+        self.export_unit(key)
+
+    def export_unit(self, key):
+        """Removes a unit from this controller and returns its state, for import_unit() on another one."""
+        with self.lock:
+            state = self.state.export(key)
+            state["rules"] = self.unit_rules.pop(key, None)
+            self.motion_timers.cancel(key)
+        return state
+
+    def snapshot(self):
+        """Copy of the state of every unit, in the form import_unit() takes (without the compiled rules)."""
+        with self.lock:
+            return {key: self.state.state_of(slot) for key, slot in self.state.index.items()}
+
+    def import_unit(self, key, state):
+        """
+        Takes over a unit exported by another controller. Anything this
+        controller already received for the unit is newer and is kept.
+        """
+        with self.lock:
+            slot = self.state.slot(key)
+            for device_name, status in (state.get("device_status") or {}).items():
+                if self.state.device(slot, device_name) is None:
+                    self.state.set_device(slot, device_name, status)
+            for sensor, value in (state.get("readings") or {}).items():
+                if self.state.reading(slot, sensor) is None:
+                    self.state.set_reading(slot, sensor, value)
+            if state.get("last_motion"):
+                self.state.last_motion[slot] = max(state["last_motion"], self.state.last_motion[slot])
+            if state.get("updated"):
+                self.state.updated[slot] = max(state["updated"], self.state.updated[slot])
+            if state.get("rules") is not None and key not in self.unit_rules:
+                self.unit_rules[key] = state["rules"]
+            self.schedule_motion_timeout(key)
+
+    def run_rules(self, key, input_name, event=None):
+        """Evaluates only the unit's rules that depend on `input_name` and applies those that match."""
+        start = time.time()
+        ruleset = self.unit_rules.get(key, self.default_rules)
+        slot = self.state.slot(key)
+        ctx = UnitContext(ReadingsView(self.state, slot), DevicesView(self.state, slot),
+                          self.state.last_motion[slot], event)
+        fired = ruleset.evaluate(input_name, ctx)
+        if self.metrics is not None:
+            # Evaluation only; publishing the commands is the "publish" stage
+            self.metrics.observe("rule_eval", key[0], time.time() - start)
+        for rule in fired:
+            print(f"[ACTION] Rule '{rule.id}' in {key} -> {rule.device} {rule.command}")
+            self.send_command(key, rule.device, rule.command, rule.reason)
+
+    def schedule_motion_timeout(self, key):
+        """Wakes the unit's timer rules at the next noMotionFor deadline that is still ahead."""
+        ruleset = self.unit_rules.get(key, self.default_rules)
+        slot = self.state.index.get(key)
+        last_motion = self.state.last_motion[slot] if slot is not None else 0
+        if not last_motion:
+            return
+        for timeout in ruleset.motion_timeouts:
+            if last_motion + timeout > time.time():
+                self.motion_timers.schedule(key, last_motion + timeout, self.on_motion_timeout)
+                return
+
+    def on_motion_timeout(self, key):
+        with self.lock:
+            self.run_rules(key, TIMER_INPUT)
+            self.schedule_motion_timeout(key)
+
+    def sweep(self, now=None):
+        """
+        Safety net for missed events: applies the default low-light and
+        bright-and-idle rules to every unit in one vectorized pass. Units with
+        their own rules are left to the event-driven path.
+        """
+        now = now if now is not None else time.time()
+        rules = {rule.id: rule for rule in self.default_rules.rules}
+        sent = 0
+        with self.lock:
+            on_slots, off_slots = bulk_evaluate(self.state, now)
+            for slots, rule in ((on_slots, rules["low_light_on"]), (off_slots, rules["bright_idle_off"])):
+                for slot in slots:
+                    key = self.state.keys[slot]
+                    if self.unit_rules.get(key, self.default_rules) is not self.default_rules:
+                        continue
+                    self.send_command(key, rule.device, rule.command, rule.reason)
+                    sent += 1
+        return sent
+
+    def tick(self):
+        self.motion_timers.advance()
+
+    def stop(self):
+        self.tick_job.cancel()
+
+    def on_device_state(self, key, device_name, status):
+        """State published by the actuator on its retained state topic."""
+        with self.lock:
+            slot = self.state.slot(key)
+            self.state.set_device(slot, device_name, status)
+            self.state.updated[slot] = time.time()
+        self.commands.on_state(key, device_name, status)
 
     def send_command(self, key, device_name, command, reason):
+        self.commands.submit(key, device_name, command, reason, self.publish_command)
+
+    def publish_command(self, key, device_name, command, reason):
         houseID, floorID, unitID = key
         topic = f"{self.main_topic}/commands/{houseID}/{floorID}/{unitID}/{device_name}"
         msg = copy.deepcopy(self.msg_template)
         msg["bn"] = topic
         msg["e"][0]["t"] = str(time.time())
         msg["e"][0]["v"] = command
+        # Recorded before publishing: a command released by the rate limit is sent from the timer
+        # thread, and the actuator's state echo could otherwise set the status first and skip the write
+        with self.lock:
+            self.update_catalog(key, device_name, command, reason)
+        start = time.time()
         self.client.myPublish(topic, msg)
+        if self.metrics is not None:
+            self.metrics.observe("publish", houseID, time.time() - start)
+            # Set by the instancer while it handles a sensor message on this thread
+            sensor_time = getattr(message_timing, "sensor_time", None)
+            if sensor_time is not None:
+                self.metrics.observe("sensor_to_command", houseID, start - sensor_time)
         print(f"[CMD] {command} -> {topic} (Reason: {reason})")
-        self.update_catalog(key, device_name, command, reason)
         
     def update_catalog(self, key, device_name, new_status, reason):
-        if key not in self.device_status_cache:
-            self.device_status_cache[key] = {}
-        
-        if self.device_status_cache[key].get(device_name) == new_status:
+        slot = self.state.slot(key)
+        if self.state.device(slot, device_name) == new_status:
             return
         
-        self.device_status_cache[key][device_name] = new_status
-        
-        try:
-            r = requests.get(f"{self.catalogAddress}/houses")
-            houses = r.json()
-            device_to_update = None
-            for house in houses:
-                if str(house.get("houseID")) == str(key[0]):
-                    for floor in house.get("floors", []):
-                        if str(floor.get("floorID")) == str(key[1]):
-                            for unit in floor.get("units", []):
-                                if str(unit.get("unitID")) == str(key[2]):
-                                    for device in unit.get("devicesList", []):
-                                        if device.get("deviceName") == device_name:
-                                            device_to_update = device
-                                            break
-            
-            if device_to_update:
-                device_to_update["deviceStatus"] = new_status
-                device_to_update["lastUpdate"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                # Add the reason to the device's data
-                device_to_update["lastCommandReason"] = reason
-                requests.put(f"{self.catalogAddress}/devices", json=device_to_update)
-            
-        except Exception as e:
-            print(f"[ERROR] Failed to update catalog: {e}")
\ No newline at end of file
+        self.state.set_device(slot, device_name, new_status)
+        self.writer.submit(key, device_name, new_status, reason)
@@ -0,0 +1,59 @@
+# changelog:
+# - 2026-10-19: Created. Local (unit, deviceName) -> deviceID index so status updates can target one device.
+
+import time
+import threading
+import requests
+
+
+def unit_key(houseID, floorID, unitID):
+    """Same (house, floor, unit) key the controllers use: numeric IDs as int."""
+    return tuple(int(v) if str(v).isdigit() else v for v in (houseID, floorID, unitID))
+
+
+class DeviceDirectory:
+    """
+    Maps (unit key, deviceName) to the catalog deviceID.
+
+    The instancer refreshes it with the house list it already downloads for
+    rebalancing. On a miss the directory reloads itself from the catalog, at
+    most once every MIN_REFRESH_INTERVAL seconds, so a device registered in
+    between is found without hammering the catalog for devices that do not exist.
+    """
+    MIN_REFRESH_INTERVAL = 10
+
+    def __init__(self, catalogAddress):
+        self.catalogAddress = catalogAddress.rstrip('/')
+        self.devices = {}
+        self.last_refresh = 0
+        self.lock = threading.Lock()
+
+    def refresh(self, houses):
+        devices = {}
+        for house in houses:
+            for floor in house.get("floors", []):
+                for unit in floor.get("units", []):
+                    key = unit_key(house.get("houseID"), floor.get("floorID"), unit.get("unitID"))
+                    for device in unit.get("devicesList", []):
+                        devices[(key, device.get("deviceName"))] = device.get("deviceID")
+        with self.lock:
+            self.devices = devices
+            self.last_refresh = time.time()
+
+    def refresh_from_catalog(self):
+        try:
+            r = requests.get(f"{self.catalogAddress}/houses", timeout=5)
+            r.raise_for_status()
+            self.refresh(r.json())
+        except Exception as e:
+            print(f"[ERROR] Failed to refresh device directory: {e}")
+            with self.lock:
+                self.last_refresh = time.time()
+
+    def lookup(self, key, device_name):
+        """Returns the deviceID of a unit's device, or None if the catalog does not know it."""
+        device_id = self.devices.get((key, device_name))
+        if device_id is None and time.time() - self.last_refresh > self.MIN_REFRESH_INTERVAL:
+            self.refresh_from_catalog()
+            device_id = self.devices.get((key, device_name))
+        return device_id
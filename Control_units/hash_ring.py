@@ -0,0 +1,53 @@
+# changelog:
+# - 2026-10-19: Created. Consistent hash ring used to spread houses over CU processes.
+
+import bisect
+import hashlib
+
+
+def stable_hash(value):
+    """Hash that is the same in every process (the built-in hash() of a str is salted)."""
+    return int.from_bytes(hashlib.md5(str(value).encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Each node is placed on the ring `vnodes` times, and a key belongs to the
+    first node clockwise from its hash. Adding or removing a node only moves
+    about 1/N of the keys.
+    """
+
+    def __init__(self, nodes=(), vnodes=64):
+        self.vnodes = vnodes
+        self._hashes = []
+        self._owners = []
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.vnodes):
+            h = stable_hash(f"{node}#{i}")
+            idx = bisect.bisect(self._hashes, h)
+            self._hashes.insert(idx, h)
+            self._owners.insert(idx, node)
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        kept = [(h, n) for h, n in zip(self._hashes, self._owners) if n != node]
+        self._hashes = [h for h, _ in kept]
+        self._owners = [n for _, n in kept]
+
+    def get(self, key):
+        """Returns the node owning the key, or None if the ring is empty."""
+        if not self._hashes:
+            return None
+        idx = bisect.bisect(self._hashes, stable_hash(key)) % len(self._hashes)
+        return self._owners[idx]
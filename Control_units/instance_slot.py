@@ -0,0 +1,36 @@
+# changelog:
+# - 2026-10-19: Created. Stable name for the files a control-unit process keeps between runs.
+
+import os
+import socket
+
+try:
+    import fcntl
+except ImportError:  # not on Windows
+    fcntl = None
+
+
+def claim_instance_id(directory, prefix, max_slots=64):
+    """
+    Returns (instance_id, lock_file): the first free `<prefix>_<n>`, held by an
+    exclusive lock on `<directory>/<prefix>_<n>.lock` while lock_file stays open.
+
+    A container's hostname changes when it is recreated, so it cannot name the
+    spool or checkpoint a process must find again after a restart. A slot can:
+    the lock goes away with the process, and the next one to start takes the
+    lowest free slot, with its files. Replicas sharing the directory get
+    different slots. Without fcntl the hostname is used.
+    """
+    if fcntl is None:
+        return f"{prefix}_{socket.gethostname()}", None
+    os.makedirs(directory, exist_ok=True)
+    for n in range(max_slots):
+        instance_id = f"{prefix}_{n}"
+        lock_file = open(os.path.join(directory, f"{instance_id}.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        return instance_id, lock_file
+    raise RuntimeError(f"All {max_slots} instance slots in {directory} are taken")
@@ -0,0 +1,104 @@
+# changelog:
+# - 2026-10-19: Created. Per-stage, per-house latency histograms and a /metrics endpoint in Prometheus text format.
+
+import bisect
+import threading
+import cherrypy
+
+# Upper bounds in seconds, from sub-millisecond dispatch to multi-second catalog retries
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def senml_time(payload):
+    """Timestamp `t` of the first SenML record as a float, or None."""
+    try:
+        return float(payload["e"][0]["t"])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf if it is past the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class LatencyMetrics:
+    """
+    Latency histograms keyed by (stage, house). Stages are free-form names
+    such as "broker_delivery" or "dispatch_wait"; a reading with a negative
+    latency (clock skew between containers) is counted as 0.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, house, seconds):
+        with self.lock:
+            hist = self.histograms.get((stage, str(house)))
+            if hist is None:
+                hist = self.histograms[(stage, str(house))] = Histogram()
+            hist.observe(max(0.0, seconds))
+
+    def summary(self):
+        """{stage: (count, p50, p99)} over all houses, for log lines."""
+        with self.lock:
+            merged = {}
+            for (stage, _), hist in self.histograms.items():
+                total = merged.setdefault(stage, Histogram())
+                total.counts = [a + b for a, b in zip(total.counts, hist.counts)]
+                total.total += hist.total
+                total.count += hist.count
+        return {stage: (h.count, h.quantile(0.5), h.quantile(0.99)) for stage, h in sorted(merged.items())}
+
+    def render(self):
+        lines = [
+            "# HELP thiefdetector_stage_latency_seconds Latency of each control-loop stage.",
+            "# TYPE thiefdetector_stage_latency_seconds histogram",
+        ]
+        with self.lock:
+            items = sorted(self.histograms.items())
+            for (stage, house), hist in items:
+                labels = f'service="{self.service}",stage="{stage}",house="{house}"'
+                cumulative = 0
+                for bound, n in zip(BUCKETS, hist.counts):
+                    cumulative += n
+                    lines.append(f'thiefdetector_stage_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'thiefdetector_stage_latency_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f'thiefdetector_stage_latency_seconds_sum{{{labels}}} {hist.total:.6f}')
+                lines.append(f'thiefdetector_stage_latency_seconds_count{{{labels}}} {hist.count}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsEndpoint:
+    """CherryPy handler serving LatencyMetrics.render() on GET."""
+    exposed = True
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def GET(self, *uri, **params):
+        cherrypy.response.headers["Content-Type"] = "text/plain; version=0.0.4"
+        return self.metrics.render()
@@ -0,0 +1,156 @@
+# changelog:
+# - 2026-10-19: Created. Pluggable payload codecs for the MQTT client (JSON, CBOR and MessagePack SenML).
+
+import json
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Integer labels of RFC 8428 (SenML) used by the binary codecs instead of string keys
+BASE_NAME, NAME, UNIT, VALUE, STRING_VALUE, BOOL_VALUE, TIME = -2, 0, 1, 2, 3, 4, 6
+
+# Topic suffix level that marks a binary payload, e.g. ThiefDetector/sensors/1/1/1/light_sensor/@cbor
+SUFFIX_PREFIX = "@"
+
+
+def is_senml(msg):
+    """True for our {"bn": ..., "e": [...]} messages, the only ones the binary codecs pack."""
+    return isinstance(msg, dict) and not set(msg) - {"bn", "e"} and isinstance(msg.get("e"), list)
+
+
+def senml_to_records(msg):
+    """
+    Packs our {"bn": ..., "e": [{"n", "u", "t", "v"}]} messages into a list of
+    SenML records with integer labels. Anything else is passed through unchanged.
+    """
+    if not is_senml(msg):
+        return msg
+    records = []
+    for i, event in enumerate(msg["e"]):
+        record = {}
+        if i == 0 and msg.get("bn") is not None:
+            record[BASE_NAME] = msg["bn"]
+        for key, label in (("n", NAME), ("u", UNIT)):
+            if key in event:
+                record[label] = event[key]
+        if event.get("t") is not None:
+            try:
+                record[TIME] = float(event["t"])
+            except (TypeError, ValueError):
+                record[TIME] = event["t"]
+        value = event.get("v")
+        if isinstance(value, bool):
+            record[BOOL_VALUE] = value
+        elif isinstance(value, (int, float)):
+            record[VALUE] = value
+        elif value is not None:
+            record[STRING_VALUE] = value
+        records.append(record)
+    return records
+
+
+def records_to_senml(records):
+    """Inverse of senml_to_records(). The timestamp is given back as a string, as in the JSON messages."""
+    if not isinstance(records, list):
+        return records
+    msg = {"bn": None, "e": []}
+    for record in records:
+        if BASE_NAME in record:
+            msg["bn"] = record[BASE_NAME]
+        event = {}
+        if NAME in record:
+            event["n"] = record[NAME]
+        if UNIT in record:
+            event["u"] = record[UNIT]
+        if TIME in record:
+            event["t"] = repr(record[TIME]) if isinstance(record[TIME], float) else record[TIME]
+        for label in (VALUE, STRING_VALUE, BOOL_VALUE):
+            if label in record:
+                event["v"] = record[label]
+        msg["e"].append(event)
+    return msg
+
+
+class JsonCodec:
+    name = "json"
+    content_type = "application/json"
+
+    def encode(self, msg):
+        return json.dumps(msg).encode("utf-8")
+
+    def decode(self, data):
+        return json.loads(data.decode("utf-8"))
+
+
+class CborSenmlCodec:
+    name = "cbor"
+    content_type = "application/senml+cbor"
+
+    def encode(self, msg):
+        return cbor2.dumps(senml_to_records(msg))
+
+    def decode(self, data):
+        return records_to_senml(cbor2.loads(data))
+
+
+class MsgpackSenmlCodec:
+    name = "msgpack"
+    content_type = "application/senml+msgpack"
+
+    def encode(self, msg):
+        return msgpack.packb(senml_to_records(msg), use_bin_type=True)
+
+    def decode(self, data):
+        return records_to_senml(msgpack.unpackb(data, raw=False, strict_map_key=False))
+
+
+def available_codecs():
+    """Codecs whose library is installed, by name."""
+    codecs = {"json": JsonCodec()}
+    if cbor2 is not None:
+        codecs["cbor"] = CborSenmlCodec()
+    if msgpack is not None:
+        codecs["msgpack"] = MsgpackSenmlCodec()
+    return codecs
+
+
+CODECS = available_codecs()
+CODECS_BY_CONTENT_TYPE = {codec.content_type: codec for codec in CODECS.values()}
+
+
+def get_codec(name):
+    if name not in ("json", "cbor", "msgpack"):
+        raise ValueError(f"Unknown payload codec '{name}'. Use json, cbor or msgpack")
+    if name not in CODECS:
+        print(f"[WARN] Library for codec '{name}' is not installed, falling back to JSON")
+        return CODECS["json"]
+    return CODECS[name]
+
+
+def topic_for(topic, codec):
+    """Topic to publish on: binary payloads get a codec suffix level, JSON keeps the plain topic."""
+    return topic if codec.name == "json" else f"{topic}/{SUFFIX_PREFIX}{codec.name}"
+
+
+def split_topic(topic, content_type=None):
+    """
+    Returns (plain topic, codec) for a received message. The codec is taken from
+    the MQTT v5 content-type property when present, then from the topic suffix,
+    and defaults to JSON.
+    """
+    base, _, last = topic.rpartition("/")
+    suffix_codec = None
+    if last.startswith(SUFFIX_PREFIX):
+        suffix_codec = CODECS.get(last[len(SUFFIX_PREFIX):])
+        if suffix_codec is not None:
+            topic = base
+    if content_type and content_type in CODECS_BY_CONTENT_TYPE:
+        return topic, CODECS_BY_CONTENT_TYPE[content_type]
+    return topic, suffix_codec or CODECS["json"]
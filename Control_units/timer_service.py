@@ -0,0 +1,124 @@
+# changelog:
+# - 2026-10-19: Created. One timer thread and a small worker pool shared by every controller of the process.
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+
+class TimerJob:
+    """Handle returned by TimerService.call_later/call_every. cancel() stops any run that has not started."""
+    __slots__ = ("when", "interval", "func", "args", "name", "cancelled")
+
+    def __init__(self, when, interval, func, args, name):
+        self.when = when
+        self.interval = interval
+        self.func = func
+        self.args = args
+        self.name = name
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerService:
+    """
+    Schedules one-shot and periodic jobs for the whole process on a single heap.
+
+    One timer thread sleeps until the earliest job is due and hands it to a
+    pool of `workers` threads, so the thread count does not grow with the
+    number of controllers. A periodic job is re-armed when its run ends, so it
+    never runs twice at the same time; runs missed while it was busy are
+    skipped. Lateness is the delay between the time a job was due and the time
+    a worker started it.
+    """
+
+    def __init__(self, workers=2):
+        self.heap = []
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.ready = queue.Queue()
+        self.running = True
+        self.stats = {"scheduled": 0, "ran": 0, "failed": 0, "cancelled": 0,
+                      "late_total": 0.0, "late_max": 0.0}
+
+        self.timer_thread = threading.Thread(target=self._run_timer, daemon=True)
+        self.timer_thread.start()
+        self.workers = [threading.Thread(target=self._run_worker, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def call_later(self, delay, func, *args, name=None):
+        return self._push(TimerJob(time.time() + delay, None, func, args, name or getattr(func, "__name__", "job")))
+
+    def call_every(self, interval, func, *args, name=None, first_delay=None):
+        delay = interval if first_delay is None else first_delay
+        return self._push(TimerJob(time.time() + delay, interval, func, args, name or getattr(func, "__name__", "job")))
+
+    def _push(self, job):
+        with self.cond:
+            heapq.heappush(self.heap, (job.when, next(self.seq), job))
+            self.stats["scheduled"] += 1
+            # Wake the timer thread only if this job is now the earliest
+            if self.heap[0][2] is job:
+                self.cond.notify()
+        return job
+
+    def get_stats(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats["pending"] = len(self.heap)
+        stats["late_avg"] = stats["late_total"] / stats["ran"] if stats["ran"] else 0.0
+        stats["queued"] = self.ready.qsize()
+        stats["threads"] = 1 + len(self.workers)
+        return stats
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        for _ in self.workers:
+            self.ready.put(None)
+
+    def _run_timer(self):
+        while True:
+            with self.cond:
+                while self.running and (not self.heap or self.heap[0][0] > time.time()):
+                    self.cond.wait(self.heap[0][0] - time.time() if self.heap else None)
+                if not self.running:
+                    return
+                _, _, job = heapq.heappop(self.heap)
+            if job.cancelled:
+                with self.cond:
+                    self.stats["cancelled"] += 1
+                continue
+            self.ready.put(job)
+
+    def _run_worker(self):
+        while True:
+            job = self.ready.get()
+            if job is None:
+                return
+            if job.cancelled:
+                continue
+            late = max(0.0, time.time() - job.when)
+            try:
+                job.func(*job.args)
+                failed = False
+            except Exception as e:
+                print(f"[ERROR] Timer job '{job.name}' failed: {e}")
+                failed = True
+            with self.cond:
+                self.stats["ran"] += 1
+                self.stats["failed"] += failed
+                self.stats["late_total"] += late
+                self.stats["late_max"] = max(self.stats["late_max"], late)
+            if job.interval is not None and not job.cancelled and self.running:
+                job.when = max(job.when + job.interval, time.time())
+                with self.cond:
+                    heapq.heappush(self.heap, (job.when, next(self.seq), job))
+                    if self.heap[0][2] is job:
+                        self.cond.notify()
@@ -0,0 +1,72 @@
+# changelog:
+# - 2026-10-19: Created. Hashed timer wheel for per-unit deadlines (motion timeouts).
+
+import math
+import time
+import threading
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: a ring of `slots` buckets, one per `tick` seconds.
+
+    A timer lands in the bucket of its deadline and carries the number of full
+    turns ("rounds") left before it is due, so advance() only looks at the
+    buckets of the ticks that passed, never at every timer. Timers are keyed:
+    scheduling a key again replaces its previous timer. Deadlines are rounded
+    up to the next tick.
+    """
+
+    def __init__(self, tick=1.0, slots=64, now=None):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]
+        self.index = {}
+        self.cursor = 0
+        self.current = now if now is not None else time.time()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def schedule(self, key, deadline, callback):
+        with self.lock:
+            self._cancel(key)
+            ticks = max(1, math.ceil((deadline - self.current) / self.tick))
+            slot = (self.cursor + ticks) % len(self.slots)
+            self.slots[slot][key] = [(ticks - 1) // len(self.slots), callback]
+            self.index[key] = slot
+
+    def cancel(self, key):
+        with self.lock:
+            return self._cancel(key)
+
+    def _cancel(self, key):
+        slot = self.index.pop(key, None)
+        if slot is None:
+            return False
+        del self.slots[slot][key]
+        return True
+
+    def advance(self, now=None):
+        """Moves the wheel up to `now` and runs the callbacks of the timers that expired. Returns how many ran."""
+        now = now if now is not None else time.time()
+        expired = []
+        with self.lock:
+            while self.current + self.tick <= now:
+                self.current += self.tick
+                self.cursor = (self.cursor + 1) % len(self.slots)
+                bucket = self.slots[self.cursor]
+                for key in list(bucket):
+                    entry = bucket[key]
+                    if entry[0] > 0:
+                        entry[0] -= 1
+                        continue
+                    del bucket[key]
+                    del self.index[key]
+                    expired.append((key, entry[1]))
+        for key, callback in expired:
+            try:
+                callback(key)
+            except Exception as e:
+                print(f"[ERROR] Timer callback for {key} failed: {e}")
+        return len(expired)
@@ -0,0 +1,168 @@
+# changelog:
+# - 2026-10-19: Created. Columnar per-unit state for the controllers (one slot per unit, typed arrays).
+# - 2026-10-19: Added the `used` column so bulk evaluation can skip freed slots without a Python loop.
+
+import math
+from array import array
+
+NAN = float("nan")
+
+# Small codes for the values nearly every unit has; anything else goes to the sparse extras
+MOTION_CODES = {"No Motion": 0, "Detected": 1}
+SWITCH_CODES = {"OFF": 0, "ON": 1, "DISABLE": 2}
+MOTION_NAMES = {code: name for name, code in MOTION_CODES.items()}
+SWITCH_NAMES = {code: name for name, code in SWITCH_CODES.items()}
+UNKNOWN = -1
+
+LIGHT_SENSOR = "light_sensor"
+MOTION_SENSOR = "motion_sensor"
+LIGHT_SWITCH = "light_switch"
+
+
+class UnitStateStore:
+    """
+    State of the units of one controller, stored by column.
+
+    Each unit key gets a dense integer slot. The light level, motion reading,
+    last motion time, last update time and light switch status live in typed
+    arrays indexed by slot, so a unit costs a few dozen bytes instead of
+    several dicts. Other sensors and devices a rule may use are kept in small
+    per-slot dicts, created only for units that have them. Freed slots are
+    reused.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.keys = []
+        self.free = []
+        self.used = array("b")
+        self.light = array("d")
+        self.motion = array("b")
+        self.last_motion = array("d")
+        self.updated = array("d")
+        self.switch = array("b")
+        self.extra_readings = {}
+        self.extra_devices = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def units(self):
+        return list(self.index)
+
+    def slot(self, key):
+        """Slot of a unit, allocated on first use."""
+        slot = self.index.get(key)
+        if slot is not None:
+            return slot
+        if self.free:
+            slot = self.free.pop()
+            self.keys[slot] = key
+            self.used[slot] = 1
+            self.light[slot] = NAN
+            self.motion[slot] = UNKNOWN
+            self.last_motion[slot] = 0.0
+            self.updated[slot] = 0.0
+            self.switch[slot] = UNKNOWN
+        else:
+            slot = len(self.keys)
+            self.keys.append(key)
+            self.used.append(1)
+            self.light.append(NAN)
+            self.motion.append(UNKNOWN)
+            self.last_motion.append(0.0)
+            self.updated.append(0.0)
+            self.switch.append(UNKNOWN)
+        self.index[key] = slot
+        return slot
+
+    def set_reading(self, slot, sensor, value):
+        if sensor == LIGHT_SENSOR:
+            try:
+                self.light[slot] = float(value)
+                return
+            except (TypeError, ValueError):
+                pass
+        if sensor == MOTION_SENSOR and value in MOTION_CODES:
+            self.motion[slot] = MOTION_CODES[value]
+        else:
+            self.extra_readings.setdefault(slot, {})[sensor] = value
+
+    def reading(self, slot, sensor, default=None):
+        if sensor == LIGHT_SENSOR and not math.isnan(self.light[slot]):
+            return self.light[slot]
+        if sensor == MOTION_SENSOR and self.motion[slot] != UNKNOWN:
+            return MOTION_NAMES[self.motion[slot]]
+        return self.extra_readings.get(slot, {}).get(sensor, default)
+
+    def set_device(self, slot, device_name, status):
+        if device_name == LIGHT_SWITCH and status in SWITCH_CODES:
+            self.switch[slot] = SWITCH_CODES[status]
+            self.extra_devices.get(slot, {}).pop(LIGHT_SWITCH, None)
+        else:
+            if device_name == LIGHT_SWITCH:
+                self.switch[slot] = UNKNOWN
+            self.extra_devices.setdefault(slot, {})[device_name] = status
+
+    def device(self, slot, device_name, default=None):
+        if device_name == LIGHT_SWITCH and self.switch[slot] != UNKNOWN:
+            return SWITCH_NAMES[self.switch[slot]]
+        return self.extra_devices.get(slot, {}).get(device_name, default)
+
+    def readings_of(self, slot):
+        readings = dict(self.extra_readings.get(slot, {}))
+        for sensor in (LIGHT_SENSOR, MOTION_SENSOR):
+            value = self.reading(slot, sensor)
+            if value is not None:
+                readings[sensor] = value
+        return readings
+
+    def devices_of(self, slot):
+        devices = dict(self.extra_devices.get(slot, {}))
+        if self.switch[slot] != UNKNOWN:
+            devices[LIGHT_SWITCH] = SWITCH_NAMES[self.switch[slot]]
+        return devices
+
+    def export(self, key):
+        """Removes a unit and returns its state as a dict (see Controler.import_unit)."""
+        slot = self.index.pop(key, None)
+        if slot is None:
+            return {"device_status": None, "last_motion": None, "readings": None, "updated": None}
+        state = self.state_of(slot)
+        self.keys[slot] = None
+        self.used[slot] = 0
+        self.extra_readings.pop(slot, None)
+        self.extra_devices.pop(slot, None)
+        self.free.append(slot)
+        return state
+
+    def state_of(self, slot):
+        return {
+            "device_status": self.devices_of(slot),
+            "last_motion": self.last_motion[slot] or None,
+            "readings": self.readings_of(slot),
+            "updated": self.updated[slot] or None,
+        }
+
+
+class ReadingsView:
+    """dict-like .get() over the readings of one slot, for rule predicates."""
+    __slots__ = ("store", "slot")
+
+    def __init__(self, store, slot):
+        self.store = store
+        self.slot = slot
+
+    def get(self, sensor, default=None):
+        return self.store.reading(self.slot, sensor, default)
+
+
+class DevicesView(ReadingsView):
+    """dict-like .get() over the device statuses of one slot, for rule predicates."""
+    __slots__ = ()
+
+    def get(self, device_name, default=None):
+        return self.store.device(self.slot, device_name, default)
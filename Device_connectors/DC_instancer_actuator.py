@@ -3,8 +3,10 @@
 # - 2025-07-17: Simplified registration loop.
 
 # - 2025-07-27: Removed the erroneous call to the non-existent registerer() function.
+# - 2026-10-19: All connectors share one LatencyMetrics, served on /metrics.
 
 from device_connector_actuator import Device_connector_act
+from latency_metrics import LatencyMetrics, MetricsEndpoint
 import json
 import time
 import cherrypy
@@ -23,6 +25,7 @@ if __name__ == "__main__":
     baseClientID = settingAct["clientID"]
     DCID_act_dict = settingAct["DCID_dict"]
 
+    metrics = LatencyMetrics("actuators")
     deviceConnectorsAct = {}
     for DCID, plantConfig in DCID_act_dict.items():
         DC_name = f"arduino_{DCID}"
@@ -30,7 +33,8 @@ if __name__ == "__main__":
             catalog_url,
             plantConfig,
             baseClientID,
-            DCID
+            DCID,
+            metrics
         )
         deviceConnectorsAct[DC_name] = connector
         cherrypy.tree.mount(connector, f'/{DC_name}', {
@@ -40,6 +44,10 @@ if __name__ == "__main__":
         })
         print(f"Mounted {DC_name} to CherryPy")
 
+    cherrypy.tree.mount(MetricsEndpoint(metrics), '/metrics', {
+        '/': {'request.dispatch': cherrypy.dispatch.MethodDispatcher()}
+    })
+
     cherrypy.config.update({
         'server.socket_host': '0.0.0.0',
         'server.socket_port': 8086
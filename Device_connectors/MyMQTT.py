@@ -1,8 +1,381 @@
 import json
+import os
+import time
+import struct
+import threading
+import collections
 import paho.mqtt.client as PahoMQTT
+from senml_codec import get_codec, is_senml, split_topic, topic_for, CODECS
+
+
+# Timing of the message being delivered on the current thread: received_at (taken off the
+# network) and dequeued_at (handed to the notifier). Read it from notify() for latency metrics.
+message_timing = threading.local()
+
+
+def unit_key_from_topic(topic):
+    """Default ordering key: the house/floor/unit part of a ThiefDetector topic."""
+    return "/".join(topic.split("/")[2:5])
+
+
+def is_telemetry_topic(topic):
+    """Sensor readings can be shed under load, commands never are."""
+    return "/sensors/" in topic
+
+
+class KeyedDispatcher:
+    """
+    Hands received messages to a small pool of worker threads.
+
+    Every key (by default a house/floor/unit) is pinned to one worker, so the
+    messages of a unit are handled in arrival order while different units are
+    processed in parallel. Each worker owns a bounded queue; when it is full
+    the backpressure policy decides what happens:
+      - "block":          the network thread waits for room in the queue
+      - "drop_oldest":    the oldest queued message of that worker is dropped
+      - "shed_telemetry": new sensor messages are dropped, commands still block
+    """
+    POLICIES = ("block", "drop_oldest", "shed_telemetry")
+
+    def __init__(self, handler, workers=4, queue_size=1000, policy="block",
+                 key_func=unit_key_from_topic, telemetry_func=is_telemetry_topic):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{policy}'. Use one of {self.POLICIES}")
+        self.handler = handler
+        self.queue_size = queue_size
+        self.policy = policy
+        self.key_func = key_func
+        self.telemetry_func = telemetry_func
+
+        self._queues = [collections.deque() for _ in range(workers)]
+        self._conds = [threading.Condition() for _ in range(workers)]
+        self._running = True
+        self._stats_lock = threading.Lock()
+        self.stats = {"enqueued": 0, "processed": 0, "dropped": 0, "shed": 0, "blocked": 0, "max_depth": 0}
+
+        self._threads = []
+        for idx in range(workers):
+            t = threading.Thread(target=self._worker_loop, args=(idx,), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def submit(self, topic, payload):
+        """Queues a message. Returns False if it was shed by the backpressure policy."""
+        idx = hash(self.key_func(topic)) % len(self._queues)
+        queue, cond = self._queues[idx], self._conds[idx]
+        with cond:
+            if len(queue) >= self.queue_size:
+                if self.policy == "drop_oldest":
+                    queue.popleft()
+                    self._count("dropped")
+                elif self.policy == "shed_telemetry" and self.telemetry_func(topic):
+                    self._count("shed")
+                    return False
+                else:
+                    self._count("blocked")
+                    while len(queue) >= self.queue_size and self._running:
+                        cond.wait()
+            queue.append((topic, payload, time.time()))
+            depth = len(queue)
+            cond.notify_all()
+        with self._stats_lock:
+            self.stats["enqueued"] += 1
+            if depth > self.stats["max_depth"]:
+                self.stats["max_depth"] = depth
+        return True
+
+    def _worker_loop(self, idx):
+        queue, cond = self._queues[idx], self._conds[idx]
+        while True:
+            with cond:
+                while not queue and self._running:
+                    cond.wait()
+                if not queue:
+                    return
+                topic, payload, _enqueued_at = queue.popleft()
+                cond.notify_all()
+            try:
+                self.handler(topic, payload)
+            except Exception as e:
+                print(f"[ERROR] Dispatcher worker {idx} failed on topic {topic}: {e}")
+            self._count("processed")
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["depths"] = [len(q) for q in self._queues]
+        stats["depth"] = sum(stats["depths"])
+        return stats
+
+    def stop(self, timeout=5):
+        """Lets the workers drain what is already queued, then stops them."""
+        self._running = False
+        for cond in self._conds:
+            with cond:
+                cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+
+
+class _SegmentQueue:
+    """
+    Append-only queue of length-prefixed records stored in numbered segment files.
+
+    Only the segment being written and the one being read are open, so memory
+    use does not depend on the backlog. A read cursor walks the records and
+    commit() makes the position durable (segments behind it are deleted), while
+    rewind() goes back to the last commit so unconfirmed records are sent again.
+    """
+    HEADER = struct.Struct(">QBBHI")  # seq, qos, retain, topic length, payload length
+
+    def __init__(self, path, max_bytes, policy, segment_bytes):
+        if policy not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown spool drop policy '{policy}'")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.segment_bytes = min(segment_bytes, max(max_bytes // 4, 1))
+        self.dropped = 0
+
+        self.segments = {}  # segment id -> [size in bytes, record count]
+        for name in os.listdir(path):
+            if name.endswith(".seg"):
+                seg_id = int(name[:-4])
+                self.segments[seg_id] = [os.path.getsize(self._seg_path(seg_id)), self._count_records(seg_id)]
+        self.committed = self._load_cursor()
+        self.cursor = self.committed
+        self._writer = None
+        self._writer_id = None
+        self._reader = None
+        self._reader_id = None
+        self._pending = None
+
+    def _seg_path(self, seg_id):
+        return os.path.join(self.path, f"{seg_id:010d}.seg")
+
+    def _count_records(self, seg_id):
+        count = 0
+        with open(self._seg_path(seg_id), "rb") as f:
+            while True:
+                header = f.read(self.HEADER.size)
+                if len(header) < self.HEADER.size:
+                    return count
+                _, _, _, topic_len, payload_len = self.HEADER.unpack(header)
+                f.seek(topic_len + payload_len, os.SEEK_CUR)
+                count += 1
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.path, "cursor"), "r") as f:
+                seg_id, offset = (int(v) for v in f.read().split())
+            if seg_id in self.segments:
+                return (seg_id, offset)
+        except (OSError, ValueError):
+            pass
+        return (min(self.segments), 0) if self.segments else (0, 0)
+
+    def _save_cursor(self):
+        tmp = os.path.join(self.path, "cursor.tmp")
+        with open(tmp, "w") as f:
+            f.write(f"{self.committed[0]} {self.committed[1]}")
+        os.replace(tmp, os.path.join(self.path, "cursor"))
+
+    def total_bytes(self):
+        return sum(size for size, _ in self.segments.values())
+
+    def pending_records(self):
+        return sum(count for _, count in self.segments.values())
+
+    def _drop_oldest_segment(self):
+        oldest = min(self.segments)
+        if oldest == self._writer_id:
+            self._close_writer()
+        if oldest == self._reader_id:
+            self._close_reader()
+        self.dropped += self.segments.pop(oldest)[1]
+        os.remove(self._seg_path(oldest))
+        following = min(self.segments) if self.segments else oldest + 1
+        if self.committed[0] <= oldest:
+            self.committed = (following, 0)
+            self._save_cursor()
+        if self.cursor[0] <= oldest:
+            self.cursor = (following, 0)
+            self._pending = None
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._writer, self._writer_id = None, None
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+        self._reader, self._reader_id = None, None
+
+    def append(self, seq, topic, payload, qos, retain):
+        """Stores a record. Returns False if it was rejected by the drop policy."""
+        topic_bytes = topic.encode("utf-8")
+        record = self.HEADER.pack(seq, qos, int(retain), len(topic_bytes), len(payload)) + topic_bytes + payload
+        while self.segments and self.total_bytes() + len(record) > self.max_bytes:
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                return False
+            self._drop_oldest_segment()
+
+        if self._writer is None or self.segments[self._writer_id][0] >= self.segment_bytes:
+            self._close_writer()
+            self._writer_id = max(self.segments) + 1 if self.segments else self.cursor[0] + 1
+            self.segments[self._writer_id] = [0, 0]
+            self._writer = open(self._seg_path(self._writer_id), "ab")
+        self._writer.write(record)
+        self._writer.flush()
+        self.segments[self._writer_id][0] += len(record)
+        self.segments[self._writer_id][1] += 1
+        return True
+
+    def peek(self):
+        """Returns the record at the read cursor as (seq, topic, payload, qos, retain), or None."""
+        if self._pending is None:
+            self._pending = self._read_at_cursor()
+        return self._pending[0] if self._pending else None
+
+    def _read_at_cursor(self):
+        while True:
+            seg_id, offset = self.cursor
+            if seg_id not in self.segments:
+                later = [s for s in self.segments if s > seg_id]
+                if not later:
+                    return None
+                self.cursor = (min(later), 0)
+                continue
+            if self._reader_id != seg_id:
+                self._close_reader()
+                self._reader = open(self._seg_path(seg_id), "rb")
+                self._reader_id = seg_id
+            self._reader.seek(offset)
+            header = self._reader.read(self.HEADER.size)
+            if len(header) == self.HEADER.size:
+                seq, qos, retain, topic_len, payload_len = self.HEADER.unpack(header)
+                body = self._reader.read(topic_len + payload_len)
+                if len(body) == topic_len + payload_len:
+                    record = (seq, body[:topic_len].decode("utf-8"), body[topic_len:], qos, bool(retain))
+                    return record, (seg_id, offset + self.HEADER.size + len(body))
+            if seg_id == self._writer_id or seg_id == max(self.segments):
+                return None  # caught up with the writer
+            self.cursor = (seg_id + 1, 0)
+
+    def advance(self):
+        """Moves the read cursor past the record returned by peek()."""
+        if self._pending:
+            self.cursor = self._pending[1]
+        self._pending = None
+
+    def commit(self):
+        """Makes the read cursor durable and deletes the segments that are fully sent."""
+        self.committed = self.cursor
+        for seg_id in [s for s in self.segments if s < self.committed[0]]:
+            if seg_id == self._reader_id:
+                self._close_reader()
+            self.segments.pop(seg_id)
+            os.remove(self._seg_path(seg_id))
+        seg = self.segments.get(self.committed[0])
+        if seg is not None and self.committed[1] >= seg[0]:
+            # Everything in the last segment read has been sent, the next append starts a new one
+            if self.committed[0] == self._writer_id:
+                self._close_writer()
+            if self.committed[0] == self._reader_id:
+                self._close_reader()
+            self.segments.pop(self.committed[0])
+            os.remove(self._seg_path(self.committed[0]))
+        self._save_cursor()
+
+    def rewind(self):
+        """Goes back to the last committed position."""
+        self.cursor = self.committed
+        self._pending = None
+
+    def is_empty(self):
+        return self.peek() is None
+
+
+class OfflineSpool:
+    """
+    Disk-backed outbound queue used while the broker is unreachable.
+
+    Telemetry and commands are kept in separate segment queues, each with its
+    own size cap and drop policy ("drop_oldest" deletes the oldest segment,
+    "drop_newest" refuses new records). Records carry a sequence number and
+    read_batch() merges the two queues back into publish order.
+    """
+
+    def __init__(self, directory, limits, segment_bytes=1024 * 1024):
+        self.queues = {
+            name: _SegmentQueue(os.path.join(directory, name), cfg["max_bytes"], cfg["policy"], segment_bytes)
+            for name, cfg in limits.items()
+        }
+        self._seq = 0
+        self.lock = threading.Lock()
+
+    def classify(self, topic):
+        return "telemetry" if is_telemetry_topic(topic) else "commands"
+
+    def append(self, topic, payload, qos, retain):
+        with self.lock:
+            self._seq = max(self._seq + 1, time.time_ns())
+            return self.queues[self.classify(topic)].append(self._seq, topic, payload, qos, retain)
+
+    def read_batch(self, max_records):
+        """Returns up to max_records records in publish order and moves the read cursors past them."""
+        batch = []
+        with self.lock:
+            while len(batch) < max_records:
+                heads = [(record[0], queue) for queue in self.queues.values()
+                         for record in [queue.peek()] if record is not None]
+                if not heads:
+                    break
+                _, queue = min(heads, key=lambda head: head[0])
+                batch.append(queue.peek())
+                queue.advance()
+        return batch
+
+    def commit(self):
+        with self.lock:
+            for queue in self.queues.values():
+                queue.commit()
+
+    def rewind(self):
+        with self.lock:
+            for queue in self.queues.values():
+                queue.rewind()
+
+    def is_empty(self):
+        with self.lock:
+            return all(queue.is_empty() for queue in self.queues.values())
+
+    def get_stats(self):
+        with self.lock:
+            return {name: {"bytes": queue.total_bytes(), "records": queue.pending_records(), "dropped": queue.dropped}
+                    for name, queue in self.queues.items()}
+
 
 class MyMQTT:
-    def __init__(self, clientID, broker, port, notifier):
+    # Default caps of the offline spool. Old telemetry is worth less than new telemetry,
+    # while commands are never dropped silently from the middle of the backlog.
+    SPOOL_LIMITS = {
+        "telemetry": {"max_bytes": 8 * 1024 * 1024, "policy": "drop_oldest"},
+        "commands": {"max_bytes": 32 * 1024 * 1024, "policy": "drop_newest"},
+    }
+    SPOOL_BATCH = 200
+    RECONNECT_MIN_DELAY = 1
+    RECONNECT_MAX_DELAY = 60
+
+    def __init__(self, clientID, broker, port, notifier, dispatch_workers=0, dispatch_queue_size=1000, backpressure="block",
+                 spool_dir=None, spool_limits=None, codec="json"):
         self.broker = broker
         self.port = port
         self.notifier = notifier  # Object that handles notifications (e.g., your main controller class)
@@ -10,40 +383,178 @@ class MyMQTT:
         self._topic = []
         self._isSubscriber = False
 
-        # Create an instance of paho.mqtt.client
-        self._paho_mqtt = PahoMQTT.Client(client_id=clientID, clean_session=True)
+        # Create an instance of paho.mqtt.client, or a client of an in-process
+        # broker stand-in such as benchmarks/local_broker.py when one is passed as broker
+        if hasattr(broker, "create_client"):
+            self._paho_mqtt = broker.create_client(clientID)
+        else:
+            self._paho_mqtt = PahoMQTT.Client(client_id=clientID, clean_session=True)
+
+        # With dispatch_workers > 0 the notifier runs on a worker pool instead of paho's network thread
+        self.dispatcher = None
+        if dispatch_workers > 0 and notifier is not None:
+            self.dispatcher = KeyedDispatcher(self._deliver, dispatch_workers, dispatch_queue_size, backpressure)
 
+        # Codec used for outgoing SenML messages. Received messages are decoded with whatever
+        # codec their content type or topic suffix announces, so JSON and binary producers can coexist.
+        self.codec = get_codec(codec)
+
+        # With a spool_dir, messages published while disconnected are kept on disk instead of in paho's memory queue
+        self.spool = OfflineSpool(spool_dir, spool_limits or self.SPOOL_LIMITS) if spool_dir else None
+        self._connected = False
+        self._draining = False
+        self._drain_lock = threading.Lock()
+        self._drain_wakeup = threading.Event()
+        if self.spool is not None:
+            threading.Thread(target=self._drain_loop, daemon=True).start()
+        self._paho_mqtt.reconnect_delay_set(self.RECONNECT_MIN_DELAY, self.RECONNECT_MAX_DELAY)
 
         # Register the callback methods
         self._paho_mqtt.on_connect = self.myOnConnect
+        self._paho_mqtt.on_disconnect = self.myOnDisconnect
         self._paho_mqtt.on_message = self.myOnMessageReceived
 
     def myOnConnect(self, paho_mqtt, userdata, flags, rc):
         print(f"Connected to {self.broker} with result code: {rc}")
+        if rc != 0:
+            return
+        # Subscriptions made while the broker was unreachable never reached it
+        for topic in self._topic:
+            self._paho_mqtt.subscribe(topic, qos=2)
+        with self._drain_lock:
+            self._connected = True
+            if self.spool is not None:
+                # Decided afresh on every connect, so a flag left over from a broken drain cannot stick
+                self._draining = not self.spool.is_empty()
+                if self._draining:
+                    self._drain_wakeup.set()
+
+    def myOnDisconnect(self, paho_mqtt, userdata, rc):
+        self._connected = False
+        print(f"Disconnected from {self.broker} with result code: {rc}")
+
+    def _drain_loop(self):
+        """Publishes the spooled backlog in order, in batches, every time the broker comes back."""
+        while True:
+            self._drain_wakeup.wait()
+            self._drain_wakeup.clear()
+            try:
+                self._drain_backlog()
+            except Exception as e:
+                print(f"[SPOOL] Drain stopped: {e}")
+            finally:
+                with self._drain_lock:
+                    # Unless a reconnect meanwhile has already decided and woken the loop up again
+                    if not self._drain_wakeup.is_set():
+                        self._draining = False
+
+    def _drain_backlog(self):
+        sent = 0
+        while self._connected:
+            with self._drain_lock:
+                batch = self.spool.read_batch(self.SPOOL_BATCH)
+                if not batch:
+                    # From now on new messages are published directly again
+                    self._draining = False
+                    print(f"[SPOOL] Backlog drained, {sent} messages sent.")
+                    return
+            infos = [self._paho_mqtt.publish(topic, payload, qos=qos, retain=retain)
+                     for _, topic, payload, qos, retain in batch]
+            try:
+                for info in infos:
+                    info.wait_for_publish(timeout=30)
+                delivered = all(info.is_published() for info in infos)
+            except Exception as e:
+                print(f"[SPOOL] Failed to drain backlog: {e}")
+                delivered = False
+            if not delivered:
+                # Resend from the last confirmed batch after the next reconnect
+                self.spool.rewind()
+                return
+            self.spool.commit()
+            sent += len(batch)
 
     def myOnMessageReceived(self, paho_mqtt, userdata, msg):
         """
         A new message is received on a subscribed topic.
-        Forward the topic and payload to the notifier for further handling.
+        Hand it to the dispatcher, or handle it inline when no dispatcher is configured.
+        """
+        properties = getattr(msg, "properties", None)
+        content_type = getattr(properties, "ContentType", None) if properties is not None else None
+        if self.dispatcher is not None:
+            self.dispatcher.submit(msg.topic, (msg.payload, content_type, time.time()))
+        else:
+            self._deliver(msg.topic, (msg.payload, content_type, time.time()))
+
+    def _deliver(self, topic, raw_message):
+        """
+        Decode the payload and forward the topic and payload to the notifier.
         """
         try:
-            payload = json.loads(msg.payload.decode('utf-8'))
-            self.notifier.notify(msg.topic, payload)
+            raw_payload, content_type, received_at = raw_message
+            message_timing.received_at = received_at
+            message_timing.dequeued_at = time.time()
+            if not raw_payload:
+                return  # an empty payload only clears a retained message
+            topic, codec = split_topic(topic, content_type)
+            payload = codec.decode(raw_payload)
+            self.notifier.notify(topic, payload)
         except json.JSONDecodeError as e:
-            print(f"Failed to decode JSON message on topic {msg.topic}: {e}")
+            print(f"Failed to decode JSON message on topic {topic}: {e}")
         except Exception as e:
-            print(f"Error processing message on topic {msg.topic}: {e}")
+            print(f"Error processing message on topic {topic}: {e}")
+
+    def is_connected(self):
+        """True while the client is connected to the broker."""
+        return self._connected
+
+    def get_spool_stats(self):
+        """Size of the offline backlog per message class, empty when spooling is off."""
+        return self.spool.get_stats() if self.spool is not None else {}
+
+    def get_dispatch_stats(self):
+        """Queue depths and counters of the dispatcher, empty when dispatching inline."""
+        return self.dispatcher.get_stats() if self.dispatcher is not None else {}
 
-    def myPublish(self, topic, msg):
+    def myPublish(self, topic, msg, retain=False):
         """
         Publish a message to a specific topic.
+        While disconnected, or while an older backlog is still draining, the message goes to the spool.
         """
         try:
-            self._paho_mqtt.publish(topic, json.dumps(msg), qos=2)
-            print(f"Published message to {topic}: {msg}")
+            codec = self.codec if is_senml(msg) else CODECS["json"]
+            if self._publish(topic_for(topic, codec), codec.encode(msg), retain):
+                print(f"Published message to {topic}: {msg}")
         except Exception as e:
             print(f"Failed to publish message to {topic}: {e}")
 
+    def myClearRetained(self, topic):
+        """
+        Remove the retained message of a topic by publishing an empty retained payload.
+        """
+        try:
+            self._publish(topic, b"", True)
+        except Exception as e:
+            print(f"Failed to clear the retained message of {topic}: {e}")
+
+    def _publish(self, wire_topic, payload, retain):
+        """Publishes now, or spools while disconnected. Returns True if published now."""
+        if self.spool is not None:
+            with self._drain_lock:
+                if not self._connected or self._draining:
+                    if not self.spool.append(wire_topic, payload, 2, retain):
+                        print(f"[SPOOL] Spool full, dropped message to {wire_topic}")
+                    return False
+        self._paho_mqtt.publish(wire_topic, payload, qos=2, retain=retain)
+        return True
+
+    def myWillSet(self, topic, msg, retain=True):
+        """
+        Register a last will message, published by the broker if this client dies.
+        Must be called before start().
+        """
+        self._paho_mqtt.will_set(topic, json.dumps(msg), qos=2, retain=retain)
+
     def mySubscribe(self, topic):
         """
         Subscribe to a topic.
@@ -61,7 +572,8 @@ class MyMQTT:
         Start the MQTT client and connect to the broker.
         """
         try:
-            self._paho_mqtt.connect(self.broker, self.port)
+            # connect_async lets the network loop retry with backoff if the broker is not up yet
+            self._paho_mqtt.connect_async(self.broker, self.port)
             self._paho_mqtt.loop_start()
             print("MQTT client started.")
         except Exception as e:
@@ -89,6 +601,8 @@ class MyMQTT:
                     self._paho_mqtt.unsubscribe(topic)
             self._paho_mqtt.loop_stop()
             self._paho_mqtt.disconnect()
+            if self.dispatcher is not None:
+                self.dispatcher.stop()
             print("MQTT client stopped.")
         except Exception as e:
             print(f"Failed to stop MQTT client: {e}")
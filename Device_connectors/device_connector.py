@@ -1,6 +1,8 @@
 # changelog:
 # - 2025-07-21: Formally added the motion_sensor to the device list for API polling.
 # - 2025-07-21: The connector now updates the in-memory status of the motion sensor.
+# - 2026-10-19: Readings published while the broker is down are spooled to disk instead of kept in memory.
+# - 2026-10-19: The payload codec (json, cbor or msgpack SenML) can be chosen per connector with PAYLOAD_CODEC.
 
 import requests
 import time
@@ -9,6 +11,7 @@ import copy
 import cherrypy
 import logging
 import threading
+import os
 
 from MyMQTT import MyMQTT
 from sensors import LightSensor, MotionSensor
@@ -17,8 +20,8 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 class senPublisher():
-    def __init__(self, clientID, broker, port):
-        self.client = MyMQTT(clientID, broker, port, None)
+    def __init__(self, clientID, broker, port, codec="json"):
+        self.client = MyMQTT(clientID, broker, port, None, spool_dir=os.path.join("spool", clientID), codec=codec)
         self.start()
 
     def start(self):
@@ -42,6 +45,7 @@ class Device_connector():
         self.clientID = f"{baseClientID}_{houseID}_{floorID}_{unitID}_DCS"
         self.DATA_AVG_INTERVAL = self.DCConfiguration.get("DATA_AVG_INTERVAL", 10)
         self.DATA_SENDING_INTERVAL = self.DCConfiguration.get("DATA_SENDING_INTERVAL", 15) # Faster for demo
+        self.PAYLOAD_CODEC = self.DCConfiguration.get("PAYLOAD_CODEC", "json")
         self.latest_light_reading = 0 
 
 
@@ -54,7 +58,7 @@ class Device_connector():
             logger.error(f"Failed to get broker info from catalog: {e}")
             return
 
-        self.senPublisher = senPublisher(self.clientID, broker, port)
+        self.senPublisher = senPublisher(self.clientID, broker, port, self.PAYLOAD_CODEC)
         self.light_sensor = LightSensor(f"{houseID}_{floorID}_{unitID}_light")
         self.motion_sensor = MotionSensor(f"{houseID}_{floorID}_{unitID}_motion")
 
@@ -4,8 +4,13 @@
 
 # - 2025-07-29: Removed catalog update logic to enforce a single source of truth.
 #   The Control Unit is now solely responsible for updating the catalog.
+# - 2026-10-19: Commands are routed through the shared TopicRouter.
+# - 2026-10-19: The applied state of each device is published, retained, on ThiefDetector/state/<h>/<f>/<u>/<device>.
+# - 2026-10-19: Command delivery and apply latency are recorded in the optional shared LatencyMetrics.
 
-from MyMQTT import MyMQTT
+from MyMQTT import MyMQTT, message_timing
+from latency_metrics import senml_time
+from topic_router import TopicRouter
 import requests
 import time
 import json
@@ -14,11 +19,13 @@ import cherrypy
 class Device_connector_act():
     exposed = True
 
-    def __init__(self, catalog_url, DCConfiguration, baseClientID, DCID):
+    def __init__(self, catalog_url, DCConfiguration, baseClientID, DCID, metrics=None):
         self.catalog_url = catalog_url
+        self.metrics = metrics
         self.DCConfiguration = DCConfiguration
         self.clientID = f"{baseClientID}_{DCID}_DCA_{int(time.time())}"
         self.devices = self.DCConfiguration.get("devicesList", [])
+        self.router = TopicRouter()
         
         try:
             self.houseID, self.floorID, self.unitID = DCID.split("-")
@@ -33,8 +40,11 @@ class Device_connector_act():
             print(f"[{self.clientID}] MQTT client started.")
             
             topic = f"ThiefDetector/commands/{self.houseID}/{self.floorID}/{self.unitID}/#"
+            self.router.add_route(f"ThiefDetector/commands/{self.houseID}/{self.floorID}/{self.unitID}/+", self.on_command)
             self.client.mySubscribe(topic)
             print(f"[{self.clientID}] Subscribed to topic: {topic}")
+            for device in self.devices:
+                self.publish_state(device)
         except Exception as e:
             print(f"[{self.clientID} ERROR] Failed to start MQTT client: {e}")
 
@@ -47,19 +57,37 @@ class Device_connector_act():
     def notify(self, topic, payload):
         print(f"[{self.clientID} NOTIFY] Command received on topic: {topic}")
         try:
-            event = payload.get("e", [{}])[0]
-            deviceStatusValue = event.get("v", "unknown")
-            deviceName = topic.split("/")[-1]
-
-            for device in self.devices:
-                if device["deviceName"].lower() == deviceName.lower():
-                    print(f"[{self.clientID}] Updating '{deviceName}' status to '{deviceStatusValue}'")
-                    device["deviceStatus"] = deviceStatusValue
-                    device["lastUpdate"] = time.strftime("%Y-%m-%d %H:%M:%S")
-                    # The actuator no longer updates the catalog directly.
+            self.router.dispatch(topic, payload)
         except Exception as e:
             print(f"[{self.clientID} ERROR] Unexpected error in notify: {e}")
 
+    def on_command(self, key, payload):
+        event = payload.get("e", [{}])[0]
+        deviceStatusValue = event.get("v", "unknown")
+        deviceName = key.device
+        start = time.time()
+        if self.metrics is not None:
+            command_time = senml_time(payload)
+            received_at = getattr(message_timing, "received_at", None)
+            if command_time is not None and received_at is not None:
+                self.metrics.observe("command_delivery", self.houseID, received_at - command_time)
+
+        for device in self.devices:
+            if device["deviceName"].lower() == deviceName.lower():
+                print(f"[{self.clientID}] Updating '{deviceName}' status to '{deviceStatusValue}'")
+                device["deviceStatus"] = deviceStatusValue
+                device["lastUpdate"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                # The actuator no longer updates the catalog directly.
+                self.publish_state(device)
+        if self.metrics is not None:
+            self.metrics.observe("actuator_apply", self.houseID, time.time() - start)
+
+    def publish_state(self, device):
+        """Retained, so the control unit learns the current state even after a restart."""
+        topic = f"ThiefDetector/state/{self.houseID}/{self.floorID}/{self.unitID}/{device['deviceName']}"
+        msg = {"bn": topic, "e": [{"n": "state", "u": "status", "t": str(time.time()), "v": device["deviceStatus"]}]}
+        self.client.myPublish(topic, msg, retain=True)
+
     def stop(self):
         self.client.stop()
         print(f"[{self.clientID}] MQTT client stopped.")
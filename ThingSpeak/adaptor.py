@@ -4,46 +4,84 @@
 
 
 # - 2025-07-27: Updated to fetch MQTT config from the catalog service to work inside Docker.
+# - 2026-10-19: MQTT messages are routed through the shared TopicRouter.
+# - 2026-10-19: Channels and fields are read from the catalog (refreshed every 60 s); every change is buffered
+#   with its timestamp and uploaded through the bulk-update API, one request per channel per flush.
+# - 2026-10-19: Uploads moved to ChannelUploader (one scheduler thread, pooled session, backoff on 429/5xx);
+#   the ThingSpeak base URL can be set with THINGSPEAK_URL. The mapping refresh runs on one long-lived thread.
+# - 2026-10-19: Sensor readings and device states are also kept in a local TimeSeriesStore, queried on /series.
+# - 2026-10-19: ThingSpeak entries go through a durable SQLite outbox (OUTBOX_PATH).
+# - 2026-10-19: Write API keys are kept here (THINGSPEAK_WRITE_KEYS) instead of in the catalog, which serves them to anyone.
 
+import os
 import requests
 import time
 import threading
-from flask import Flask
+from flask import Flask, jsonify, request
 from MyMQTT2 import MyMQTT
+from topic_router import TopicRouter
+from channel_uploader import ChannelUploader
+from timeseries_store import TimeSeriesStore
+
+# Numeric value stored for the status strings of sensors and actuators
+STATUS_VALUES = {"ON": 1, "OFF": 0, "Detected": 1, "No Motion": 0}
+
+def parse_write_keys(text):
+    """{channelID: write API key} from "<channelID>:<key>,<channelID>:<key>"."""
+    keys = {}
+    for item in (text or "").split(","):
+        channel, _, key = item.strip().partition(":")
+        if channel and key:
+            keys[channel.strip()] = key.strip()
+    return keys
 
 class Adaptor:
-    def __init__(self, catalog_url):
+    """
+    Logs every light switch command to ThingSpeak. The channel and field of each
+    unit come from the "thingSpeak" section of its house in the catalog:
+
+        {"channelID": "123456", "fields": {"<floorID>-<unitID>": "field1"}}
+
+    The write API key of each channel is not in the catalog, which anyone
+    can read: it comes from THINGSPEAK_WRITE_KEYS ("<channelID>:<key>,...")
+    or WRITE_KEYS.
+
+    Each change is handed to the ChannelUploader with its own timestamp, so no
+    transition between two uploads is lost.
+    """
+    REFRESH_INTERVAL = 60.0
+    WRITE_KEYS = {"2884625": "TYJBKZK6C3VMU6X0", "2884626": "639Q1WGL7VNX405K"}
+
+    def __init__(self, catalog_url, thingspeak_url=None):
         self.catalog_url = catalog_url
         self.clientID = f"ThingSpeak_Adaptor_V2_{int(time.time())}"
-        self.channel_API = "https://api.thingspeak.com/update"
-        self.unit_to_field_map = {
-            "1-1-1": {"channel": "house1", "field": "field1"},
-            "1-1-2": {"channel": "house1", "field": "field2"},
-            "1-2-1": {"channel": "house1", "field": "field3"},
-            "2-1-1": {"channel": "house2", "field": "field1"},
-            "2-1-2": {"channel": "house2", "field": "field2"},
-            "2-2-1": {"channel": "house2", "field": "field3"},
-        }
-        self.api_keys = {"house1": "TYJBKZK6C3VMU6X0", "house2": "639Q1WGL7VNX405K"}
-        self.buffers = {
-            "house1": {"field1": 0, "field2": 0, "field3": 0},
-            "house2": {"field1": 0, "field2": 0, "field3": 0}
-        }
+        self.unit_to_field_map = {}
+        self.api_keys = {}
+        self.write_keys = parse_write_keys(os.environ.get("THINGSPEAK_WRITE_KEYS")) or self.WRITE_KEYS
+        self.last_values = {}
+        self.uploader = ChannelUploader(thingspeak_url,
+                                        outbox_path=os.environ.get("OUTBOX_PATH", "outbox/thingspeak.db"))
+        self.store = TimeSeriesStore(os.environ.get("TIMESERIES_DIR", "timeseries"))
+        self.store.start()
         self.lock = threading.Lock()
+        self.router = TopicRouter()
 
         try:
             broker, port, main_topic = self.get_mqtt_config()
+            self.refresh_mapping()
+            self.router.add_route(f"{main_topic}/commands/+/+/+/light_switch", self.on_light_command)
+            self.router.add_route(f"{main_topic}/sensors/+/+/+/+", self.on_sample)
+            self.router.add_route(f"{main_topic}/state/+/+/+/+", self.on_sample)
             self.client = MyMQTT(self.clientID, broker, port, self)
             self.client.start()
-            command_topic = f"{main_topic}/commands/#"
-            self.client.mySubscribe(command_topic)
-            print(f"[SUBSCRIBE] Listening for all commands on: {command_topic}")
+            for kind in ("commands", "sensors", "state"):
+                self.client.mySubscribe(f"{main_topic}/{kind}/#")
+            print(f"[SUBSCRIBE] Listening on {main_topic}/commands, /sensors and /state")
         except Exception as e:
             print(f"[ERROR] Adaptor could not start MQTT client: {e}")
             return
-            
-        for channel in self.api_keys.keys():
-            self.schedule_update(channel)
+
+        threading.Thread(target=self.refresh_loop, daemon=True).start()
 
     def get_mqtt_config(self):
         print(f"[INFO] Adaptor fetching MQTT config from {self.catalog_url}...")
@@ -55,39 +93,85 @@ class Adaptor:
         main_topic = r_topic.text.strip('"')
         return broker_info["IP"], int(broker_info["port"]), main_topic
 
-    def schedule_update(self, channel):
-        threading.Timer(15.0, self.flush_channel, args=[channel]).start()
+    def load_mapping(self, houses):
+        """Returns ({"h-f-u": {"channel", "field"}}, {channel: write API key}) from the catalog houses."""
+        unit_to_field_map, api_keys = {}, {}
+        for house in houses:
+            config = house.get("thingSpeak")
+            if not config:
+                continue
+            channel = str(config.get("channelID") or "")
+            api_key = self.write_keys.get(channel)
+            if not channel or not api_key:
+                print(f"[WARN] House {house.get('houseID')} has no ThingSpeak channelID or no write key for it, skipped")
+                continue
+            api_keys[channel] = api_key
+            for unit, field in config.get("fields", {}).items():
+                unit_to_field_map[f"{house['houseID']}-{unit}"] = {"channel": channel, "field": field}
+        return unit_to_field_map, api_keys
 
-    def flush_channel(self, channel):
+    def refresh_mapping(self):
+        r = requests.get(f"{self.catalog_url}houses", timeout=5)
+        r.raise_for_status()
+        unit_to_field_map, api_keys = self.load_mapping(r.json())
         with self.lock:
-            url = f"{self.channel_API}?api_key={self.api_keys[channel]}"
-            for field, value in self.buffers[channel].items():
-                url += f"&{field}={value}"
+            if unit_to_field_map == self.unit_to_field_map and api_keys == self.api_keys:
+                return
+            self.unit_to_field_map = unit_to_field_map
+            self.api_keys = api_keys
+            self.uploader.set_channels(api_keys)
+        print(f"[THING] Mapping loaded: {len(unit_to_field_map)} units on {len(api_keys)} channels")
+
+    def refresh_loop(self):
+        while True:
+            time.sleep(self.REFRESH_INTERVAL)
             try:
-                r = requests.get(url, timeout=5)
-                r.raise_for_status()
-                print(f"[THING] Sent to {channel}: {self.buffers[channel]} -> Status {r.status_code}")
-            except requests.exceptions.RequestException as e:
-                print(f"[ERROR] Failed to update ThingSpeak for {channel}: {e}")
-        self.schedule_update(channel)
+                self.refresh_mapping()
+            except Exception as e:
+                print(f"[ERROR] Failed to refresh the ThingSpeak mapping: {e}")
+            print(f"[THING] Uploads: {self.uploader.get_stats()}")
 
     def notify(self, topic, payload):
-        print(f"[MQTT] Adaptor received command on: {topic}")
         try:
-            parts = topic.split("/")
-            if len(parts) < 6 or parts[-1] != "light_switch":
-                return
-            unit_key = f"{parts[2]}-{parts[3]}-{parts[4]}"
-            command = payload.get("e", [{}])[0].get("v")
-            if unit_key in self.unit_to_field_map:
-                config = self.unit_to_field_map[unit_key]
-                new_value = 1 if command == "ON" else 0
-                with self.lock:
-                    self.buffers[config["channel"]][config["field"]] = new_value
-                print(f"[ADAPT] Updated {config['channel']}/{config['field']} to {new_value}")
+            self.router.dispatch(topic, payload)
         except Exception as e:
             print(f"[ERROR] Failed to process message on topic '{topic}': {e}")
 
+    def on_light_command(self, key, payload):
+        event = payload.get("e", [{}])[0]
+        new_value = 1 if event.get("v") == "ON" else 0
+        try:
+            timestamp = float(event.get("t"))
+        except (TypeError, ValueError):
+            timestamp = time.time()
+        with self.lock:
+            config = self.unit_to_field_map.get(key.unit_id)
+            if config is None:
+                return
+            channel, field = config["channel"], config["field"]
+            # Repeated commands (retries) are not transitions
+            if self.last_values.get((channel, field)) == new_value:
+                return
+            self.last_values[(channel, field)] = new_value
+            self.uploader.submit(channel, {"created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp)),
+                                           field: new_value})
+        print(f"[ADAPT] Buffered {channel}/{field} = {new_value}")
+
+    def on_sample(self, key, payload):
+        event = payload.get("e", [{}])[0]
+        value = event.get("v")
+        value = STATUS_VALUES.get(value, value)
+        if isinstance(value, str):
+            try:
+                value = float(value)
+            except ValueError:
+                return
+        try:
+            timestamp = float(event.get("t"))
+        except (TypeError, ValueError):
+            timestamp = time.time()
+        self.store.add(f"{key.unit_id}/{key.device}", timestamp, float(value))
+
 app = Flask(__name__)
 adaptor = Adaptor(catalog_url="http://catalog:8080/")
 
@@ -95,5 +179,24 @@ adaptor = Adaptor(catalog_url="http://catalog:8080/")
 def index():
     return "<h1>ThingSpeak Adaptor is Running</h1>"
 
+@app.route("/series", methods=["GET"])
+def list_series():
+    return jsonify(adaptor.store.names())
+
+@app.route("/series/<unit>/<device>", methods=["GET"])
+def query_series(unit, device):
+    """?last=<seconds> or ?start=&end= (epoch seconds), optional &resolution=1|60|3600."""
+    try:
+        end = float(request.args.get("end", time.time()))
+        start = float(request.args.get("start", end - float(request.args.get("last", 3600))))
+        width = request.args.get("resolution")
+        resolution, points = adaptor.store.query(f"{unit}/{device}", start, end, int(width) if width else None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if resolution is None:
+        return jsonify({"error": f"No series {unit}/{device}"}), 404
+    return jsonify({"series": f"{unit}/{device}", "resolution": resolution,
+                    "columns": ["t", "avg", "min", "max", "count"], "points": points})
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=8099, debug=False, use_reloader=False)
\ No newline at end of file
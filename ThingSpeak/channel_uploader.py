@@ -0,0 +1,189 @@
+# changelog:
+# - 2026-10-19: Created. One scheduler thread that uploads the buffered entries of every channel in bulk.
+# - 2026-10-19: Entries are kept in a SQLite outbox until ThingSpeak has accepted them.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = os.environ.get("THINGSPEAK_URL", "https://api.thingspeak.com")
+
+
+class ChannelUploader:
+    """
+    Uploads ThingSpeak entries per channel from a single scheduler thread.
+
+    Entries are first appended to an outbox table in SQLite (`outbox_path`, or
+    in memory when None), so they survive a failed request and a restart. Each
+    channel has its own deadline, UPDATE_INTERVAL seconds after its previous
+    answer (the ThingSpeak limit). At the deadline, its oldest MAX_BULK entries
+    are sent in id order as one bulk-update request, without holding the lock.
+    They are deleted only once ThingSpeak has accepted them; the delete is the
+    checkpoint of the drainer's progress. After an outage the backlog therefore
+    drains at MAX_BULK entries per channel every UPDATE_INTERVAL, in order.
+
+    Requests go through one requests.Session, so connections are kept alive.
+    On a connection error, 429 or 5xx the entries stay in the outbox and the
+    channel waits twice as long each time (or the Retry-After delay), up to
+    MAX_BACKOFF. Other 4xx answers mean the batch itself is refused: it is
+    deleted and counted as "rejected".
+
+    An entry can be sent twice only if the process dies, or the answer is
+    lost, after ThingSpeak stored a batch and before it was deleted here.
+    """
+    UPDATE_INTERVAL = 15.0
+    MAX_BACKOFF = 300.0
+    MAX_BULK = 960          # Entries per bulk request accepted on free accounts
+
+    def __init__(self, base_url=None, update_interval=None, pool_size=4, outbox_path=None):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip('/')
+        self.update_interval = update_interval if update_interval is not None else self.UPDATE_INTERVAL
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.db = self._open_outbox(outbox_path)
+        self.api_keys = {}
+        self.deadlines = {}
+        self.failures = {}
+        self.cond = threading.Condition()
+        self.running = True
+        self.stats = {"submitted": 0, "sent": 0, "requests": 0, "retries": 0, "rate_limited": 0,
+                      "rejected": 0}
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _open_outbox(self, path):
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                   "channel TEXT NOT NULL, entry TEXT NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS outbox_channel ON outbox (channel, id)")
+        backlog = db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        if backlog:
+            print(f"[THING] Outbox {path} holds {backlog} entries from a previous run")
+        return db
+
+    def set_channels(self, api_keys):
+        """
+        Uploads to the channels of api_keys from now on. Entries of a channel
+        that is no longer listed stay in the outbox until it comes back.
+        """
+        with self.cond:
+            for channel in list(self.deadlines):
+                if channel not in api_keys:
+                    del self.deadlines[channel]
+                    self.failures.pop(channel, None)
+                    print(f"[THING] Channel {channel} removed, {self._count(channel)} entries kept in the outbox")
+            for channel in api_keys:
+                if channel not in self.deadlines:
+                    self.deadlines[channel] = time.time() + self.update_interval
+            self.api_keys = dict(api_keys)
+            self.cond.notify()
+
+    def submit(self, channel, entry):
+        with self.cond:
+            if channel not in self.api_keys:
+                return False
+            self.db.execute("INSERT INTO outbox (channel, entry) VALUES (?, ?)",
+                            (channel, json.dumps(entry, separators=(",", ":"))))
+            self.stats["submitted"] += 1
+            return True
+
+    def _count(self, channel=None):
+        if channel is None:
+            return self.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        return self.db.execute("SELECT COUNT(*) FROM outbox WHERE channel = ?", (channel,)).fetchone()[0]
+
+    def get_stats(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats["pending"] = self._count()
+            return stats
+
+    def stop(self, timeout=5):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout)
+        self.session.close()
+        if not self.thread.is_alive():
+            self.db.close()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    now = time.time()
+                    due = [channel for channel, deadline in self.deadlines.items() if deadline <= now]
+                    if due:
+                        break
+                    self.cond.wait(min(self.deadlines.values()) - now if self.deadlines else None)
+                if not self.running:
+                    return
+                batches = []
+                for channel in due:
+                    rows = self.db.execute("SELECT id, entry FROM outbox WHERE channel = ? ORDER BY id LIMIT ?",
+                                           (channel, self.MAX_BULK)).fetchall()
+                    batches.append((channel, self.api_keys[channel], rows))
+                    self.deadlines[channel] = now + self.update_interval
+            for channel, api_key, rows in batches:
+                if rows:
+                    self._upload(channel, api_key, rows)
+
+    def _upload(self, channel, api_key, rows):
+        url = f"{self.base_url}/channels/{channel}/bulk_update.json"
+        batch = [json.loads(entry) for _, entry in rows]
+        retry_after = None
+        try:
+            r = self.session.post(url, json={"write_api_key": api_key, "updates": batch}, timeout=10)
+            status = r.status_code
+            retry_after = r.headers.get("Retry-After")
+        except requests.exceptions.RequestException as e:
+            print(f"[ERROR] Failed to update ThingSpeak channel {channel}: {e}")
+            status = None
+
+        with self.cond:
+            self.stats["requests"] += 1
+            if status is not None and status < 400:
+                self._delete(channel, rows[-1][0])
+                self.stats["sent"] += len(batch)
+                self.failures.pop(channel, None)
+                # Counted from the answer, so the next request cannot reach ThingSpeak early
+                if channel in self.deadlines:
+                    self.deadlines[channel] = time.time() + self.update_interval
+                print(f"[THING] Sent {len(batch)} entries to channel {channel} -> Status {status}")
+                return
+            if status is not None and status < 500 and status != 429:
+                self._delete(channel, rows[-1][0])
+                self.stats["rejected"] += len(batch)
+                print(f"[ERROR] ThingSpeak refused {len(batch)} entries for channel {channel}: {status} {r.text[:200]}")
+                return
+
+            if status == 429:
+                self.stats["rate_limited"] += 1
+            elif status is not None:
+                print(f"[ERROR] ThingSpeak channel {channel} answered {status}")
+            if channel not in self.deadlines:
+                return
+            # The entries stay in the outbox and are sent again, in the same order, at the next deadline
+            self.stats["retries"] += 1
+            failures = self.failures[channel] = self.failures.get(channel, 0) + 1
+            delay = min(self.update_interval * 2 ** failures, self.MAX_BACKOFF)
+            try:
+                delay = max(delay, float(retry_after))
+            except (TypeError, ValueError):
+                pass
+            self.deadlines[channel] = time.time() + delay
+
+    def _delete(self, channel, last_id):
+        self.db.execute("DELETE FROM outbox WHERE channel = ? AND id <= ?", (channel, last_id))
@@ -0,0 +1,252 @@
+# changelog:
+# - 2026-10-19: Created. Local time-series store: fixed-size ring buffers at 1 s / 1 min / 1 h and daily disk segments.
+# - 2026-10-19: Timestamps ahead of the clock are clamped; segments older than SEGMENT_DAYS are deleted.
+
+import os
+import json
+import time
+import struct
+import threading
+from array import array
+
+# (bucket width in seconds, number of buckets kept in memory)
+# The 1 min ring holds a little over a day, so "the last 24 h" is answered at 1 min
+LEVELS = ((1, 600), (60, 1500), (3600, 24 * 60))
+
+# One closed 1-minute bucket on disk: series id, minute number, min, max, sum, count
+RECORD = struct.Struct("<IqdddI")
+PERSISTED_LEVEL = 1
+SEGMENT_DAYS = 60
+# A sample stamped further ahead than this (a wrong clock, milliseconds) is stored at the current time
+MAX_CLOCK_SKEW = 60
+
+
+class Ring:
+    """
+    `capacity` buckets of `width` seconds. A value lands in slot
+    (t // width) % capacity; the slot keeps the bucket number it holds, so
+    a slot left over from an older lap is recognised and reset.
+    """
+    __slots__ = ("width", "capacity", "bucket", "mins", "maxs", "sums", "counts")
+
+    def __init__(self, width, capacity):
+        self.width = width
+        self.capacity = capacity
+        self.bucket = array("q", [-1]) * capacity
+        self.mins = array("d", [0.0]) * capacity
+        self.maxs = array("d", [0.0]) * capacity
+        self.sums = array("d", [0.0]) * capacity
+        self.counts = array("I", [0]) * capacity
+
+    def merge(self, t, vmin, vmax, vsum, count):
+        bucket = int(t // self.width)
+        i = bucket % self.capacity
+        if self.bucket[i] != bucket:
+            if self.bucket[i] > bucket:
+                return  # Older than the whole ring
+            self.bucket[i] = bucket
+            self.mins[i], self.maxs[i], self.sums[i], self.counts[i] = vmin, vmax, vsum, count
+            return
+        self.mins[i] = min(self.mins[i], vmin)
+        self.maxs[i] = max(self.maxs[i], vmax)
+        self.sums[i] += vsum
+        self.counts[i] += count
+
+    def oldest(self, now):
+        """Start time of the oldest bucket this ring can still hold."""
+        return (int(now // self.width) - self.capacity + 1) * self.width
+
+    def buckets(self, start, end):
+        """[(bucket, min, max, sum, count)] of the filled buckets in [start, end], in time order."""
+        first, last = int(start // self.width), int(end // self.width)
+        if last - first >= self.capacity:
+            first = last - self.capacity + 1
+        found = []
+        for bucket in range(first, last + 1):
+            i = bucket % self.capacity
+            if self.bucket[i] == bucket:
+                found.append((bucket, self.mins[i], self.maxs[i], self.sums[i], self.counts[i]))
+        return found
+
+
+class TimeSeriesStore:
+    """
+    Numeric series (e.g. "1-2-1/light_sensor") kept at three resolutions. Every
+    value is merged into all of them, so the 1 min and 1 h rollups are always
+    up to date. Memory is fixed per series (about 90 KB with the default LEVELS).
+
+    Closed 1-minute buckets are appended every flush_interval seconds to one
+    segment file per UTC day under `directory`; on startup the last
+    SEGMENT_DAYS days are read back into the 1 min and 1 h rings. Queries
+    older than the in-memory 1 h ring are answered from the segments, and
+    segments older than SEGMENT_DAYS are deleted.
+
+    A timestamp from the future would hold its slot in every ring and make
+    the ring drop the real values that come later, so timestamps more than
+    MAX_CLOCK_SKEW seconds ahead are replaced by the current time.
+    """
+
+    def __init__(self, directory, levels=LEVELS, flush_interval=60):
+        self.directory = directory
+        self.levels = levels
+        self.flush_interval = flush_interval
+        self.series = {}
+        self.series_ids = {}
+        self.persisted = {}
+        self.lock = threading.Lock()
+        self.stats = {"added": 0, "persisted": 0, "loaded": 0, "clamped": 0, "segments_deleted": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def add(self, name, t, value):
+        now = time.time()
+        with self.lock:
+            if t > now + MAX_CLOCK_SKEW:
+                t = now
+                self.stats["clamped"] += 1
+            rings = self.series.get(name)
+            if rings is None:
+                rings = self._create(name)
+            for ring in rings:
+                ring.merge(t, value, value, value, 1)
+            self.stats["added"] += 1
+
+    def names(self):
+        with self.lock:
+            return sorted(self.series)
+
+    def query(self, name, start, end, width=None):
+        """
+        Points [t, avg, min, max, count] of `name` between start and end. Without
+        `width`, the finest resolution still holding `start` in memory is used.
+        """
+        with self.lock:
+            rings = self.series.get(name)
+            if rings is None:
+                return None, []
+            now = time.time()
+            if width is None:
+                ring = next((r for r in rings if r.oldest(now) <= start), rings[-1])
+            else:
+                ring = next((r for r in rings if r.width == width), None)
+                if ring is None:
+                    raise ValueError(f"Resolution must be one of {[r.width for r in rings]}")
+            buckets = ring.buckets(max(start, ring.oldest(now)), end)
+            series_id = self.series_ids[name]
+        if start < ring.oldest(now) and ring.width >= self.levels[PERSISTED_LEVEL][0]:
+            buckets = self._read_segments(series_id, start, min(end, ring.oldest(now) - 1), ring.width) + buckets
+        return ring.width, [[b * ring.width, s / c, lo, hi, c] for b, lo, hi, s, c in buckets if c]
+
+    def flush(self):
+        """Appends the 1-minute buckets closed since the last flush to today's segment."""
+        width = self.levels[PERSISTED_LEVEL][0]
+        current = int(time.time() // width)
+        segments = {}
+        count = 0
+        with self.lock:
+            for name, rings in self.series.items():
+                ring = rings[PERSISTED_LEVEL]
+                done = self.persisted.get(name, current - ring.capacity)
+                for bucket, lo, hi, s, c in ring.buckets((done + 1) * width, (current - 1) * width):
+                    day = time.strftime("%Y%m%d", time.gmtime(bucket * width))
+                    segments.setdefault(day, bytearray()).extend(
+                        RECORD.pack(self.series_ids[name], bucket, lo, hi, s, c))
+                    count += 1
+                self.persisted[name] = current - 1
+        for day, data in segments.items():
+            with open(os.path.join(self.directory, f"{day}.seg"), "ab") as f:
+                f.write(data)
+        with self.lock:
+            self.stats["persisted"] += count
+
+    def prune(self):
+        """Deletes the segments of days older than SEGMENT_DAYS."""
+        oldest = time.strftime("%Y%m%d", time.gmtime(time.time() - SEGMENT_DAYS * 86400))
+        deleted = 0
+        for filename in os.listdir(self.directory):
+            day, ext = os.path.splitext(filename)
+            if ext == ".seg" and day.isdigit() and day < oldest:
+                os.remove(os.path.join(self.directory, filename))
+                deleted += 1
+        if deleted:
+            with self.lock:
+                self.stats["segments_deleted"] += deleted
+            print(f"[TSDB] Deleted {deleted} segments older than {SEGMENT_DAYS} days")
+
+    def _create(self, name):
+        rings = self.series[name] = [Ring(width, capacity) for width, capacity in self.levels]
+        self.series_ids[name] = len(self.series_ids)
+        self._save_ids()
+        return rings
+
+    def _save_ids(self):
+        path = os.path.join(self.directory, "series.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.series_ids, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _segment_paths(self, start, end):
+        day = 86400
+        for d in range(int(start // day), int(end // day) + 1):
+            path = os.path.join(self.directory, time.strftime("%Y%m%d", time.gmtime(d * day)) + ".seg")
+            if os.path.exists(path):
+                yield path
+
+    def _records(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % RECORD.size  # A crash may leave half a record at the end
+        return RECORD.iter_unpack(data[:usable])
+
+    def _read_segments(self, series_id, start, end, width):
+        """Buckets of `width` seconds rebuilt from the 1-minute segment records."""
+        minute = self.levels[PERSISTED_LEVEL][0]
+        merged = {}
+        for path in self._segment_paths(start, end):
+            for sid, bucket, lo, hi, s, c in self._records(path):
+                if sid != series_id or not start <= bucket * minute <= end:
+                    continue
+                b = bucket * minute // width
+                if b in merged:
+                    _, plo, phi, ps, pc = merged[b]
+                    merged[b] = (b, min(plo, lo), max(phi, hi), ps + s, pc + c)
+                else:
+                    merged[b] = (b, lo, hi, s, c)
+        return [merged[b] for b in sorted(merged)]
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.directory, "series.json")) as f:
+                self.series_ids = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Ignoring unreadable time-series index: {e}")
+            return
+        names = {sid: name for name, sid in self.series_ids.items()}
+        for name in self.series_ids:
+            self.series[name] = [Ring(width, capacity) for width, capacity in self.levels]
+        minute = self.levels[PERSISTED_LEVEL][0]
+        now = time.time()
+        for path in self._segment_paths(now - SEGMENT_DAYS * 86400, now):
+            for sid, bucket, lo, hi, s, c in self._records(path):
+                name = names.get(sid)
+                if name is None:
+                    continue
+                for ring in self.series[name][PERSISTED_LEVEL:]:
+                    ring.merge(bucket * minute, lo, hi, s, c)
+                self.persisted[name] = max(self.persisted.get(name, bucket), bucket)
+                self.stats["loaded"] += 1
+        print(f"[TSDB] Loaded {len(self.series)} series, {self.stats['loaded']} buckets from {self.directory}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                self.prune()
+            except OSError as e:
+                print(f"[ERROR] Failed to write time-series segment: {e}")
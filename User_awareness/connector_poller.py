@@ -0,0 +1,140 @@
+# changelog:
+# - 2026-10-19: Created. Concurrent polling of the connectors' /devices with a TTL cache and circuit breakers.
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` failures in a row: the connector is not probed for
+    `open_for` seconds, doubled on every failed probe up to `max_open_for`.
+    One success closes it again.
+    """
+    __slots__ = ("threshold", "base_delay", "max_delay", "failures", "delay", "open_until")
+
+    def __init__(self, threshold, open_for, max_open_for):
+        self.threshold = threshold
+        self.base_delay = open_for
+        self.max_delay = max_open_for
+        self.failures = 0
+        self.delay = open_for
+        self.open_until = 0
+
+    def allow(self, now):
+        return now >= self.open_until
+
+    def success(self):
+        self.failures = 0
+        self.delay = self.base_delay
+        self.open_until = 0
+
+    def failure(self, now):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.open_until = now + self.delay
+            self.delay = min(self.delay * 2, self.max_delay)
+
+
+class ConnectorPoller:
+    """
+    Fetches the /devices list of many connectors at once on a bounded thread
+    pool, through one pooled requests.Session.
+
+    A result is cached for `ttl` seconds and shared by every caller, and a
+    connector already being fetched is not fetched twice. A connector whose
+    breaker is open, or that does not answer within `timeout`, is served from
+    its last good result (or an empty list), so a refresh takes at most about
+    `timeout` seconds however many connectors are down.
+    """
+    WORKERS = 16
+    TTL = 2.0
+    TIMEOUT = 3.0
+
+    def __init__(self, workers=None, ttl=None, timeout=None, failure_threshold=3, open_for=10.0,
+                 max_open_for=120.0):
+        workers = workers or self.WORKERS
+        self.ttl = ttl if ttl is not None else self.TTL
+        self.timeout = timeout if timeout is not None else self.TIMEOUT
+        self.breaker_args = (failure_threshold, open_for, max_open_for)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="poller")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.cache = {}
+        self.inflight = {}
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.stats = {"fetched": 0, "cached": 0, "failed": 0, "skipped_open": 0, "timed_out": 0}
+
+    def fetch_many(self, urls):
+        """{url: devices list} for the connector base URLs given."""
+        results = {}
+        futures = {}
+        now = time.time()
+        with self.lock:
+            for url in set(urls):
+                cached = self.cache.get(url)
+                if cached and now - cached[0] < self.ttl:
+                    results[url] = cached[1]
+                    self.stats["cached"] += 1
+                    continue
+                breaker = self.breakers.get(url)
+                if breaker is None:
+                    breaker = self.breakers[url] = CircuitBreaker(*self.breaker_args)
+                if not breaker.allow(now):
+                    results[url] = cached[1] if cached else []
+                    self.stats["skipped_open"] += 1
+                    continue
+                future = self.inflight.get(url)
+                if future is None:
+                    future = self.inflight[url] = self.executor.submit(self._fetch, url)
+                futures[url] = future
+
+        wait(futures.values(), timeout=self.timeout + 0.5)
+        for url, future in futures.items():
+            devices = future.result() if future.done() else None
+            if devices is None:
+                with self.lock:
+                    if not future.done():
+                        self.stats["timed_out"] += 1
+                    cached = self.cache.get(url)
+                devices = cached[1] if cached else []
+            results[url] = devices
+        return results
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["open"] = sum(1 for b in self.breakers.values() if not b.allow(time.time()))
+            return stats
+
+    def _fetch(self, url):
+        full_url = f"{url.rstrip('/')}/devices"
+        try:
+            response = self.session.get(full_url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            with self.lock:
+                self.inflight.pop(url, None)
+                self.breakers[url].failure(time.time())
+                self.stats["failed"] += 1
+            print(f"[ERROR] Operator failed to fetch from {full_url}: {e}")
+            return None
+
+        # Sensor connectors answer with their whole configuration, actuators with the list
+        devices = data.get("devicesList", []) if isinstance(data, dict) else data
+        if not isinstance(devices, list):
+            devices = []
+        with self.lock:
+            self.inflight.pop(url, None)
+            self.breakers[url].success()
+            self.cache[url] = (time.time(), devices)
+            self.stats["fetched"] += 1
+        return devices
@@ -0,0 +1,84 @@
+# changelog:
+# - 2026-10-19: Created. Fan-out of live dashboard events to Server-Sent Events clients.
+
+import json
+import threading
+from collections import deque
+
+# Returned by Subscriber.get() when the client fell behind and must be sent a new snapshot
+RESYNC = object()
+
+
+def sse_message(event, data):
+    """One Server-Sent Events message, encoded."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+class Subscriber:
+    """
+    The pending messages of one client, at most `size`. A client that falls
+    further behind loses its backlog and gets RESYNC instead, so a slow
+    browser costs a bounded amount of memory and never slows the others.
+    """
+    __slots__ = ("messages", "size", "overflowed", "cond")
+
+    def __init__(self, size):
+        self.messages = deque()
+        self.size = size
+        self.overflowed = False
+        self.cond = threading.Condition()
+
+    def put(self, message):
+        with self.cond:
+            if self.overflowed:
+                return
+            if len(self.messages) >= self.size:
+                self.messages.clear()
+                self.overflowed = True
+            else:
+                self.messages.append(message)
+            self.cond.notify()
+
+    def get(self, timeout):
+        """The next message, RESYNC, or None if nothing came within timeout."""
+        with self.cond:
+            if not self.messages and not self.overflowed:
+                self.cond.wait(timeout)
+            if self.overflowed:
+                self.overflowed = False
+                return RESYNC
+            return self.messages.popleft() if self.messages else None
+
+
+class EventBroadcaster:
+    """Encodes each event once and queues it for every connected client."""
+
+    def __init__(self, buffer_size=256):
+        self.buffer_size = buffer_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.stats = {"published": 0}
+
+    def subscribe(self):
+        subscriber = Subscriber(self.buffer_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.stats["published"] += 1
+        if not subscribers:
+            return
+        message = sse_message(event, data)
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, clients=len(self.subscribers))
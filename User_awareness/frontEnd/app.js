@@ -11,33 +11,6 @@ const themeToggleButton = document.getElementById('theme-toggle');
 const refreshTimerDiv = document.getElementById('refresh-timer');
 let motionAlerts = {}; // Store alerts with timestamps for dynamic clearing
 
-/**
- * Fetches the latest data from the Operator Control API.
- */
-async function fetchData() {
-    try {
-        const [housesResponse, alertsResponse] = await Promise.all([
-            fetch(`${API_BASE_URL}/houses`),
-            fetch(`${API_BASE_URL}/motion_alerts`)
-        ]);
-        if (!housesResponse.ok || !alertsResponse.ok) {
-            throw new Error(`API request failed`);
-        }
-        const housesData = await housesResponse.json();
-        const alertsData = await alertsResponse.json();
-        
-        (alertsData.activeAlerts || []).forEach(key => {
-            motionAlerts[key] = Date.now();
-        });
-
-        return { houses: housesData };
-    } catch (error) {
-        console.error("Failed to fetch data:", error);
-        houseGrid.innerHTML = `<div class="col-12"><div class="alert alert-danger"><strong>Connection Error:</strong> Could not connect to the backend service.</div></div>`;
-        return null;
-    }
-}
-
 /**
  * Renders the entire dashboard.
  */
@@ -194,4 +167,126 @@ function getThingSpeakLink(h){const c={'1':'2884625','2':'2884626'};const i=c[h]
 themeToggleButton.addEventListener('click',()=>{const c=document.documentElement.getAttribute('data-bs-theme');const n=c==='dark'?'light':'dark';document.documentElement.setAttribute('data-bs-theme',n);themeToggleButton.innerHTML=n==='dark'?'<i class="bi bi-sun-fill"></i>':'<i class="bi bi-moon-stars-fill"></i>'});
 
 // --- Main Application Logic ---
-async function main(){const data=await fetchData();renderDashboard(data)}main();setInterval(main,REFRESH_INTERVAL);let countdown=REFRESH_INTERVAL/1000;setInterval(()=>{countdown=countdown>1?countdown-1:REFRESH_INTERVAL/1000;refreshTimerDiv.innerHTML=`<span class="spinner-border spinner-border-sm"></span> Refreshing in ${countdown}s`},1000);
\ No newline at end of file
+// The dashboard follows GET /stream (Server-Sent Events): a snapshot, then device and alert
+// events. Browsers without EventSource fall back to polling every REFRESH_INTERVAL.
+let dashboard = { houses: {} };
+let renderPending = false;
+
+function scheduleRender() {
+    if (renderPending) return;
+    renderPending = true;
+    requestAnimationFrame(() => {
+        renderPending = false;
+        renderDashboard(dashboard);
+    });
+}
+
+/**
+ * Merges one device event ({unit: "h-f-u", device: {...}}) into the dashboard data.
+ */
+function applyDeviceEvent(event) {
+    const [houseID, floorID, unitID] = event.unit.split('-');
+    const house = dashboard.houses[houseID];
+    const floor = house && (house.floors || []).find(f => String(f.floorID) === floorID);
+    const unit = floor && (floor.units || []).find(u => String(u.unitID) === unitID);
+    if (!unit) return;
+    unit.devicesList = unit.devicesList || [];
+    const device = unit.devicesList.find(d => d.deviceName === event.device.deviceName);
+    if (device) {
+        Object.assign(device, event.device);
+    } else {
+        unit.devicesList.push(event.device);
+    }
+}
+
+function setStreamStatus(live) {
+    refreshTimerDiv.innerHTML = live
+        ? '<span class="badge bg-success"><i class="bi bi-broadcast me-1"></i>Live</span>'
+        : '<span class="spinner-border spinner-border-sm"></span> Reconnecting...';
+}
+
+function startStream() {
+    const source = new EventSource(`${API_BASE_URL}/stream`);
+    source.addEventListener('snapshot', e => {
+        const data = JSON.parse(e.data);
+        dashboard.houses = data.houses || {};
+        (data.activeAlerts || []).forEach(key => { motionAlerts[key] = Date.now(); });
+        setStreamStatus(true);
+        scheduleRender();
+    });
+    source.addEventListener('device', e => {
+        applyDeviceEvent(JSON.parse(e.data));
+        scheduleRender();
+    });
+    source.addEventListener('alert', e => {
+        motionAlerts[JSON.parse(e.data).unit] = Date.now();
+        scheduleRender();
+    });
+    // EventSource reconnects by itself and the server starts again with a snapshot
+    source.onerror = () => setStreamStatus(false);
+    // Alerts expire after ALERT_TIMEOUT even when no event arrives
+    setInterval(scheduleRender, 5000);
+}
+
+/**
+ * Polls /houses?since=dataVersion: the server answers with every house after a layout change
+ * (or on the first call), else with only the units changed since the last poll.
+ */
+let dataVersion = 0;
+
+function mergeUnit(changed) {
+    const house = dashboard.houses[changed.houseID];
+    const floor = house && (house.floors || []).find(f => String(f.floorID) === String(changed.floorID));
+    if (!floor) return false;
+    floor.units = floor.units || [];
+    const index = floor.units.findIndex(u => String(u.unitID) === String(changed.unitID));
+    if (index < 0) return false;
+    floor.units[index] = changed;
+    return true;
+}
+
+async function fetchChanges() {
+    try {
+        const response = await fetch(`${API_BASE_URL}/houses?since=${dataVersion}`);
+        if (!response.ok) {
+            throw new Error(`API request failed`);
+        }
+        const data = await response.json();
+        if (data.full) {
+            dashboard.houses = data.houses || {};
+        } else if (!(data.units || []).every(mergeUnit)) {
+            // A unit we do not know: start over with everything on the next poll
+            dataVersion = 0;
+            return dashboard;
+        }
+        dataVersion = data.version;
+        (data.activeAlerts || []).forEach(key => { motionAlerts[key] = Date.now(); });
+        return dashboard;
+    } catch (error) {
+        console.error("Failed to fetch data:", error);
+        dataVersion = 0;
+        houseGrid.innerHTML = `<div class="col-12"><div class="alert alert-danger"><strong>Connection Error:</strong> Could not connect to the backend service.</div></div>`;
+        return null;
+    }
+}
+
+async function main() {
+    const data = await fetchChanges();
+    renderDashboard(data);
+}
+
+function startPolling() {
+    main();
+    setInterval(main, REFRESH_INTERVAL);
+    let countdown = REFRESH_INTERVAL / 1000;
+    setInterval(() => {
+        countdown = countdown > 1 ? countdown - 1 : REFRESH_INTERVAL / 1000;
+        refreshTimerDiv.innerHTML = `<span class="spinner-border spinner-border-sm"></span> Refreshing in ${countdown}s`;
+    }, 1000);
+}
+
+if (window.EventSource) {
+    startStream();
+} else {
+    startPolling();
+}
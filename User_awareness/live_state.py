@@ -0,0 +1,211 @@
+# changelog:
+# - 2026-10-19: Created. In-memory house -> floor -> unit -> device state, fed by the catalog and MQTT.
+# - 2026-10-19: Listeners are told about every device change.
+# - 2026-10-19: Per-unit versions and changes_since() for delta polling.
+# - 2026-10-19: Only structural catalog changes move layout_version; status changes stamp their unit.
+# - 2026-10-19: The houses' thingSpeak section is left out of snapshots.
+
+import time
+import threading
+
+# A sensor value must move this much before its unit counts as changed for delta polling
+VALUE_DEADBAND = 10.0
+# Catalog house fields that are no business of the dashboards
+PRIVATE_HOUSE_FIELDS = ("thingSpeak",)
+
+def _time_string(t):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+
+
+class LiveStateModel:
+    """
+    The layout of the houses (floors, units, devices) comes from the catalog;
+    the current status of each device comes from MQTT:
+
+    - sensors/<h>/<f>/<u>/<device>: reading of a sensor (light level in `value`)
+    - state/<h>/<f>/<u>/<device>:   status an actuator has applied (retained)
+    - commands/<h>/<f>/<u>/<device>: last command sent, kept in `lastCommand`
+
+    Live values are kept per unit_id and deviceName, separately from the
+    catalog layout, so a catalog refresh never rolls a status back. A device
+    heard on MQTT but missing from the catalog is shown as well.
+
+    Listeners added with add_listener() are called as listener(unit_id,
+    device) after each change, outside the lock, with a copy of the device's
+    live fields (deviceName included).
+
+    Every change that a dashboard would show (a status, a command, an alert
+    touched by the caller, or a sensor value moving by VALUE_DEADBAND or
+    more) stamps its unit with the next value of a global version counter.
+    changes_since(V) returns only the units stamped after V. A change of
+    the catalog structure stamps `layout_version`, and clients older than it
+    get everything again; other catalog changes stamp the units they touch.
+    """
+
+    def __init__(self):
+        self.houses = {}
+        self.live = {}
+        self.listeners = []
+        # Started from the clock, so a version from before a restart is always older
+        self.version = int(time.time() * 1000)
+        self.layout_version = self.version
+        self.unit_versions = {}
+        self.versioned_values = {}
+        self.lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def _changed(self, unit_id, device):
+        for listener in self.listeners:
+            listener(unit_id, device)
+
+    def load_houses(self, houses_list):
+        """
+        Replaces the layout with the catalog's houses list. Only a change of the
+        structure (see layout_fingerprint) moves layout_version; a unit whose
+        catalog entry changed otherwise (e.g. a deviceStatus written by the
+        control unit) gets a new unit version.
+        """
+        houses = {str(h.get("houseID")): h for h in houses_list if h.get("houseID")}
+        with self.lock:
+            old_units = {unit_id: unit for _, _, _, unit, unit_id in self._units()}
+            old_fingerprint = self.layout_fingerprint(self.houses)
+            self.houses = houses
+            if self.layout_fingerprint(houses) != old_fingerprint:
+                self.version += 1
+                self.layout_version = self.version
+                return
+            for _, _, _, unit, unit_id in self._units():
+                if unit != old_units.get(unit_id):
+                    self._bump(unit_id)
+
+    @staticmethod
+    def layout_fingerprint(houses):
+        """The house, floor, unit and device IDs and device names, in order."""
+        return tuple(
+            (house_id, tuple(
+                (floor.get("floorID"), tuple(
+                    (unit.get("unitID"), tuple((d.get("deviceID"), d.get("deviceName"))
+                                               for d in unit.get("devicesList", [])))
+                    for unit in floor.get("units", [])))
+                for floor in house.get("floors", [])))
+            for house_id, house in houses.items())
+
+    def _bump(self, unit_id):
+        self.version += 1
+        self.unit_versions[unit_id] = self.version
+
+    def touch(self, unit_id):
+        """Marks a unit as changed for something not kept here (e.g. a motion alert)."""
+        with self.lock:
+            self._bump(unit_id)
+
+    def _live_device(self, unit_id, device_name):
+        return self.live.setdefault(unit_id, {}).setdefault(device_name, {})
+
+    def on_sensor(self, unit_id, device_name, value, t):
+        with self.lock:
+            device = self._live_device(unit_id, device_name)
+            old_status = device.get("deviceStatus")
+            if isinstance(value, (int, float)):
+                device["value"] = value
+                device["deviceStatus"] = "ON"
+                last = self.versioned_values.get((unit_id, device_name))
+                if last is None or abs(value - last) >= VALUE_DEADBAND:
+                    self.versioned_values[(unit_id, device_name)] = value
+                    old_status = None
+            else:
+                device["deviceStatus"] = value
+            device["lastUpdate"] = _time_string(t)
+            # A new lastUpdate alone does not make the unit changed
+            if device["deviceStatus"] != old_status:
+                self._bump(unit_id)
+            changed = dict(device, deviceName=device_name)
+        self._changed(unit_id, changed)
+
+    def on_state(self, unit_id, device_name, status, t):
+        with self.lock:
+            device = self._live_device(unit_id, device_name)
+            if device.get("deviceStatus") != status:
+                self._bump(unit_id)
+            device["deviceStatus"] = status
+            device["lastUpdate"] = _time_string(t)
+            changed = dict(device, deviceName=device_name)
+        self._changed(unit_id, changed)
+
+    def on_command(self, unit_id, device_name, command, t):
+        with self.lock:
+            device = self._live_device(unit_id, device_name)
+            if device.get("lastCommand") != command:
+                self._bump(unit_id)
+            device["lastCommand"] = command
+            device["lastCommandTime"] = _time_string(t)
+            # Until the actuator reports its state, the command is the best guess
+            device.setdefault("deviceStatus", command)
+            device.setdefault("lastUpdate", device["lastCommandTime"])
+            changed = dict(device, deviceName=device_name)
+        self._changed(unit_id, changed)
+
+    def unit_devices(self, unit_id, catalog_devices):
+        """Catalog devices of a unit with their live fields, plus the devices only known from MQTT."""
+        live_devices = self.live.get(unit_id, {})
+        devices = []
+        for catalog_device in catalog_devices:
+            device = dict(catalog_device)
+            device.update(live_devices.get(catalog_device.get("deviceName"), {}))
+            devices.append(device)
+        known = {device.get("deviceName") for device in catalog_devices}
+        for name, live in live_devices.items():
+            if name not in known:
+                device = {"deviceName": name}
+                device.update(live)
+                devices.append(device)
+        return devices
+
+    def _units(self):
+        """(house_id, house, floor, unit, unit_id) for every unit of the layout."""
+        for house_id, house in self.houses.items():
+            for floor in house.get("floors", []):
+                for unit in floor.get("units", []):
+                    yield house_id, house, floor, unit, f"{house_id}-{floor.get('floorID')}-{unit.get('unitID')}"
+
+    def snapshot(self):
+        """{houseID: house} in the catalog's shape, with the live device statuses."""
+        with self.lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        result = {}
+        floors = {}
+        for house_id, house, floor, unit, unit_id in self._units():
+            house_copy = result.get(house_id)
+            if house_copy is None:
+                house_copy = result[house_id] = dict(house, floors=[])
+                for field in PRIVATE_HOUSE_FIELDS:
+                    house_copy.pop(field, None)
+            floor_copy = floors.get(id(floor))
+            if floor_copy is None:
+                floor_copy = floors[id(floor)] = dict(floor, units=[])
+                house_copy["floors"].append(floor_copy)
+            unit_copy = dict(unit)
+            unit_copy["devicesList"] = self.unit_devices(unit_id, unit.get("devicesList", []))
+            floor_copy["units"].append(unit_copy)
+        return result
+
+    def changes_since(self, since):
+        """
+        {"version", "full": True, "houses"} when `since` predates the layout (or
+        comes from another run), else {"version", "full": False, "units"} with
+        the units changed after `since`, each with its houseID and floorID.
+        """
+        with self.lock:
+            if since < self.layout_version or since > self.version:
+                return {"version": self.version, "full": True, "houses": self._snapshot()}
+            units = []
+            for house_id, house, floor, unit, unit_id in self._units():
+                if self.unit_versions.get(unit_id, 0) > since:
+                    unit_copy = dict(unit, houseID=house_id, floorID=floor.get("floorID"))
+                    unit_copy["devicesList"] = self.unit_devices(unit_id, unit.get("devicesList", []))
+                    units.append(unit_copy)
+            return {"version": self.version, "full": False, "units": units}
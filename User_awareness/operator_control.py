@@ -5,30 +5,52 @@
 # - 2025-07-27: Corrected the URL in fetch_unit_devices to include the /devices endpoint.
 # - 2025-07-27: Removed debug prints for cleaner logs.
 # - 2025-07-29: Added logic to inject `lastCommandReason` for light switches based on motion alerts.
+# - 2026-10-19: MQTT messages are routed through the shared TopicRouter.
+# - 2026-10-19: /houses is served from a LiveStateModel fed by the sensor, command and state topics,
+#   instead of polling every connector over HTTP on each request.
+# - 2026-10-19: OPERATOR_STATE_SOURCE=poll restores connector polling, now concurrent, cached and behind
+#   circuit breakers (ConnectorPoller).
+# - 2026-10-19: GET /stream pushes a snapshot, then device and alert events, as Server-Sent Events.
+# - 2026-10-19: GET /houses?since=V returns only the units changed after version V (delta polling).
 
+import os
 import requests
 import cherrypy
 import time
-import json
 import threading
 from MyMQTT2 import MyMQTT 
+from topic_router import TopicRouter
+from live_state import LiveStateModel
+from connector_poller import ConnectorPoller
+from event_stream import EventBroadcaster, RESYNC, sse_message
 
 class OperatorControl:
     exposed = True
 
     def __init__(self, catalog_address):
         self.catalog_address = catalog_address.rstrip('/')
-        self.houses = {}
+        self.state = LiveStateModel()
+        # "mqtt": device statuses come from MQTT. "poll": from the connectors' /devices, for
+        # deployments where the connectors do not publish their state.
+        self.poller = ConnectorPoller() if os.environ.get("OPERATOR_STATE_SOURCE", "mqtt") == "poll" else None
         self.motion_alerts = {} 
+        self.router = TopicRouter()
+        self.broadcaster = EventBroadcaster()
+        self.state.add_listener(self.on_device_change)
 
         self.mqtt_client = None
         try:
             broker, port, main_topic = self.get_mqtt_config()
+            self.router.add_route(f"{main_topic}/sensors/+/+/+/motion_sensor", self.on_motion)
+            self.router.add_route(f"{main_topic}/sensors/+/+/+/+", self.on_sensor)
+            self.router.add_route(f"{main_topic}/state/+/+/+/+", self.on_state)
+            self.router.add_route(f"{main_topic}/commands/+/+/+/+", self.on_command)
             client_id = f"OperatorControl_{int(time.time())}"
             self.mqtt_client = MyMQTT(client_id, broker, port, self)
             self.mqtt_client.start()
-            self.mqtt_client.mySubscribe(f"{main_topic}/sensors/#")
-            print(f"[MQTT] Operator Control subscribed to {main_topic}/sensors/#")
+            for kind in ("sensors", "state", "commands"):
+                self.mqtt_client.mySubscribe(f"{main_topic}/{kind}/#")
+            print(f"[MQTT] Operator Control subscribed to {main_topic}/sensors, /state and /commands")
         except Exception as e:
             print(f"[FATAL ERROR] Could not start MQTT client: {e}")
 
@@ -38,19 +60,41 @@ class OperatorControl:
 
     def notify(self, topic, payload):
         try:
-            print(f"[MQTT NOTIFY] Received message on topic: {topic}")
-            parts = topic.split("/")
-            if len(parts) < 6 or "motion_sensor" not in parts[-1]:
-                return 
-
-            value = payload.get("e", [{}])[0].get("v")
-            if value == "Detected":
-                unit_key = f"{parts[2]}-{parts[3]}-{parts[4]}"
-                self.motion_alerts[unit_key] = time.time()
-                print(f"[ALERT] Real-time motion alert received for unit: {unit_key}")
+            self.router.dispatch(topic, payload)
         except Exception as e:
             print(f"[ERROR] Could not process MQTT message in Operator Control: {e}")
 
+    def on_motion(self, key, payload):
+        value = payload.get("e", [{}])[0].get("v")
+        if value == "Detected":
+            self.motion_alerts[key.unit_id] = time.time()
+            self.state.touch(key.unit_id)
+            self.broadcaster.publish("alert", {"unit": key.unit_id})
+            print(f"[ALERT] Real-time motion alert received for unit: {key.unit_id}")
+
+    def on_device_change(self, unit_id, device):
+        self.add_command_reason(unit_id, device, time.time())
+        self.broadcaster.publish("device", {"unit": unit_id, "device": device})
+
+    def on_sensor(self, key, payload):
+        event = payload.get("e", [{}])[0]
+        self.state.on_sensor(key.unit_id, key.device, event.get("v"), self.event_time(event))
+
+    def on_state(self, key, payload):
+        event = payload.get("e", [{}])[0]
+        self.state.on_state(key.unit_id, key.device, event.get("v"), self.event_time(event))
+
+    def on_command(self, key, payload):
+        event = payload.get("e", [{}])[0]
+        self.state.on_command(key.unit_id, key.device, event.get("v"), self.event_time(event))
+
+    @staticmethod
+    def event_time(event):
+        try:
+            return float(event.get("t"))
+        except (TypeError, ValueError):
+            return time.time()
+
     def get_mqtt_config(self):
         r_broker = requests.get(f"{self.catalog_address}/broker", timeout=5)
         r_broker.raise_for_status()
@@ -68,13 +112,11 @@ class OperatorControl:
 
         path = uri[0].lower()
         if path == "houses":
+            if "since" in params:
+                return self.get_changes(params["since"])
             return self.get_realtime_data()
         elif path == "motion_alerts":
-            active_alerts = [
-                key for key, ts in self.motion_alerts.items() 
-                if time.time() - ts < 300 
-            ]
-            return {"activeAlerts": active_alerts}
+            return {"activeAlerts": self.active_alerts()}
         return {"error": f"Endpoint '/{path}' not found."}
 
     def periodic_house_update(self):
@@ -83,66 +125,131 @@ class OperatorControl:
                 response = requests.get(f"{self.catalog_address}/houses", timeout=5)
                 response.raise_for_status()
                 houses_list = response.json()
-                self.houses = {str(h.get("houseID")): h for h in houses_list if h.get("houseID")}
-                print(f"[INFO] House list updated. Found {len(self.houses)} houses.")
+                self.state.load_houses(houses_list)
+                print(f"[INFO] House list updated. Found {len(self.state.houses)} houses.")
             except requests.exceptions.RequestException as e:
                 print(f"[ERROR] Could not update house list from catalog: {e}")
             time.sleep(60)
 
-    def get_realtime_data(self):
-        if not self.houses:
-            return {}
-        
-        real_time_houses = json.loads(json.dumps(self.houses)) 
-        
+    def get_realtime_data(self, houses=None):
+        real_time_houses = self.state.snapshot() if houses is None else houses
+        now = time.time()
+        if self.poller is not None:
+            self.fill_polled_devices(real_time_houses)
+
         for house_id, house in real_time_houses.items():
             for floor in house.get("floors", []):
                 for unit in floor.get("units", []):
-                    # Fetch the raw device list first
-                    unit["devicesList"] = self.fetch_unit_devices(unit)
-
-                    
                     unit_key = f"{house.get('houseID')}-{floor.get('floorID')}-{unit.get('unitID')}"
-                    
-                    # Check if the current unit has a recent motion alert
-                    unit_has_active_alert = (
-                        unit_key in self.motion_alerts and
-                        time.time() - self.motion_alerts.get(unit_key, 0) < 300 # 5-minute window for alerts
-                    )
-
-                    # Add the 'lastCommandReason' to light switches
                     for device in unit.get("devicesList", []):
-                        if "light_switch" in device.get("deviceName", ""):
-                            if device.get("deviceStatus") == "ON":
-                                if unit_has_active_alert:
-                                    device["lastCommandReason"] = "Motion Detected"
-                                else:
-                                    device["lastCommandReason"] = "Automatic Rule"
-                            else:  # Status is OFF
-                                device["lastCommandReason"] = "No Motion / Timed Out"
-                    
+                        self.add_command_reason(unit_key, device, now)
 
         return real_time_houses
 
-    def fetch_unit_devices(self, unit):
-        all_devices = []
-        urls_to_fetch = [unit.get("urlSensors"), unit.get("urlActuators")]
-        
-        for url in urls_to_fetch:
-            if not url: continue
+    def get_changes(self, since):
+        """
+        /houses?since=V: {"version", "full": false, "units", "activeAlerts"} with only
+        the units changed after V (each with its houseID and floorID), or
+        {"version", "full": true, "houses", "activeAlerts"} when the client must
+        start over. Clients send the returned version as the next `since`.
+        """
+        self.expire_alerts()
+        try:
+            since = int(since)
+        except (TypeError, ValueError):
+            since = -1
+        if self.poller is not None:
+            # Polled statuses are not versioned
+            since = -1
+        changes = self.state.changes_since(since)
+        if changes["full"]:
+            self.get_realtime_data(changes["houses"])
+        else:
+            now = time.time()
+            for unit in changes["units"]:
+                unit_key = f"{unit.get('houseID')}-{unit.get('floorID')}-{unit.get('unitID')}"
+                for device in unit.get("devicesList", []):
+                    self.add_command_reason(unit_key, device, now)
+        changes["activeAlerts"] = self.active_alerts()
+        return changes
+
+    def expire_alerts(self):
+        """Drops alerts older than 5 minutes; their units change (lastCommandReason, alert list)."""
+        now = time.time()
+        for unit_key, ts in list(self.motion_alerts.items()):
+            if now - ts >= 300:
+                self.motion_alerts.pop(unit_key, None)
+                self.state.touch(unit_key)
+
+    def active_alerts(self):
+        now = time.time()
+        return [key for key, ts in list(self.motion_alerts.items()) if now - ts < 300]
+
+    def add_command_reason(self, unit_key, device, now):
+        """Adds 'lastCommandReason' to light switches, from the unit's recent motion alerts."""
+        if "light_switch" not in device.get("deviceName", ""):
+            return
+        # 5-minute window for alerts
+        unit_has_active_alert = now - self.motion_alerts.get(unit_key, 0) < 300
+        if device.get("deviceStatus") == "ON":
+            if unit_has_active_alert:
+                device["lastCommandReason"] = "Motion Detected"
+            else:
+                device["lastCommandReason"] = "Automatic Rule"
+        else:  # Status is OFF
+            device["lastCommandReason"] = "No Motion / Timed Out"
+
+    def fill_polled_devices(self, houses):
+        """Replaces each unit's devicesList with what its connectors report, fetched all at once."""
+        units = [unit for house in houses.values() for floor in house.get("floors", [])
+                 for unit in floor.get("units", [])]
+        urls = [url for unit in units for url in (unit.get("urlSensors"), unit.get("urlActuators")) if url]
+        polled = self.poller.fetch_many(urls)
+        for unit in units:
+            # Copies: the poller's cached lists are shared by every request
+            unit["devicesList"] = [dict(device) for url in (unit.get("urlSensors"), unit.get("urlActuators"))
+                                   if url for device in polled.get(url, [])]
+
+class LiveStream:
+    """
+    GET /stream: Server-Sent Events. The first event is a "snapshot" ({houses,
+    activeAlerts}, like /houses and /motion_alerts); then come "device"
+    ({unit, device}) and "alert" ({unit}) events as they arrive from MQTT. A
+    client that falls behind gets a new snapshot. A comment is sent every
+    KEEPALIVE seconds so dead connections are noticed.
+    """
+    exposed = True
+    KEEPALIVE = 15
+
+    def __init__(self, operator_control):
+        self.operator_control = operator_control
+
+    def snapshot(self):
+        return sse_message("snapshot", {"houses": self.operator_control.get_realtime_data(),
+                                        "activeAlerts": self.operator_control.active_alerts()})
+
+    def GET(self, *uri, **params):
+        cherrypy.response.headers["Content-Type"] = "text/event-stream"
+        cherrypy.response.headers["Cache-Control"] = "no-cache"
+        broadcaster = self.operator_control.broadcaster
+        # Subscribed before the snapshot is taken, so no change falls in between
+        subscriber = broadcaster.subscribe()
+
+        def stream():
             try:
-                full_url = f"{url.rstrip('/')}/devices"
-                response = requests.get(full_url, timeout=3)
-                response.raise_for_status()
-                data = response.json()
-                
-                if isinstance(data, list):
-                    all_devices.extend(data)
-                
-            except requests.exceptions.RequestException as e:
-                print(f"[ERROR] Operator failed to fetch from {full_url}: {e}")
-                
-        return all_devices
+                yield b"retry: 3000\n\n" + self.snapshot()
+                while True:
+                    message = subscriber.get(self.KEEPALIVE)
+                    if message is None:
+                        yield b": keepalive\n\n"
+                    elif message is RESYNC:
+                        yield self.snapshot()
+                    else:
+                        yield message
+            finally:
+                broadcaster.unsubscribe(subscriber)
+
+        return stream()
 
 def cors():
     cherrypy.response.headers["Access-Control-Allow-Origin"] = "*"
@@ -161,7 +268,17 @@ if __name__ == "__main__":
     operator_control = OperatorControl(catalog_address)
     operator_control.OPTIONS = OPTIONS 
     
-    cherrypy.config.update({'server.socket_host': '0.0.0.0', 'server.socket_port': 8095})
+    live_stream = LiveStream(operator_control)
+    live_stream.OPTIONS = OPTIONS
+    stream_conf = {
+        "/": {"request.dispatch": cherrypy.dispatch.MethodDispatcher(), "tools.cors.on": True,
+              "response.stream": True}
+    }
+
+    # Every open /stream holds one server thread
+    cherrypy.config.update({'server.socket_host': '0.0.0.0', 'server.socket_port': 8095,
+                            'server.thread_pool': int(os.environ.get("OPERATOR_THREAD_POOL", 100))})
     cherrypy.tree.mount(operator_control, "/", conf)
+    cherrypy.tree.mount(live_stream, "/stream", stream_conf)
     cherrypy.engine.start()
     cherrypy.engine.block()
\ No newline at end of file
@@ -1,6 +1,7 @@
 # changelog:
 # - 2025-07-29: Final version with proactive alerts for all command types.
 # - The bot now listens to both sensor and command topics on MQTT.
+# - 2026-10-19: MQTT messages are routed through the shared TopicRouter.
 
 import requests
 import time
@@ -9,6 +10,7 @@ import telepot
 from telepot.loop import MessageLoop
 from telepot.namedtuple import InlineKeyboardMarkup, InlineKeyboardButton
 from MyMQTT2 import MyMQTT 
+from topic_router import TopicRouter
 
 class TeleBot:
     def __init__(self, token, operator_control_url, ownership_file, catalog_url):
@@ -17,11 +19,13 @@ class TeleBot:
         self.ownership_file = ownership_file
         self.bot = telepot.Bot(self.token)
         self.load_ownership_data()
+        self.router = TopicRouter()
 
         # NEW: Initialize and start the MQTT client for real-time alerts
         self.mqtt_client = None
         try:
             broker, port, main_topic = self.get_mqtt_config(catalog_url)
+            self.router.add_route(f"{main_topic}/sensors/+/+/+/motion_sensor", self.on_motion)
             client_id = f"TelegramBot_Alerts_{int(time.time())}"
             # The 'self' object is passed as the notifier
             self.mqtt_client = MyMQTT(client_id, broker, port, self)
@@ -55,34 +59,30 @@ class TeleBot:
     def notify(self, topic, payload):
         """MQTT callback for ALL real-time alerts."""
         try:
-            parts = topic.split("/")
-            if len(parts) < 6: return
-
-            topic_type = parts[1]
-            houseID = parts[2]
-            unit_str = f"House {houseID}, F{parts[3]}/U{parts[4]}"
-            
-            # Find the user who owns this house
-            owner_id = None
-            for user_id, owned_house_id in self.ownership_dict.items():
-                if str(owned_house_id) == str(houseID):
-                    owner_id = user_id
-                    break
-            
-            if not owner_id:
-                return # No one owns this house, so no alert to send
-
-            # Handle Motion Alerts from Sensor Topic
-            if topic_type == "sensors" and "motion_sensor" in parts[-1]:
-                value = payload.get("e", [{}])[0].get("v")
-                if value == "Detected":
-                    alert_message = f"🚨 *MOTION ALERT!* 🚨\n\nMotion detected in *{unit_str}*."
-                    self.bot.sendMessage(owner_id, alert_message, parse_mode="Markdown")
-            
-
+            self.router.dispatch(topic, payload)
         except Exception as e:
             print(f"[TELEGRAM MQTT ERROR] Could not process alert message: {e}")
 
+    def on_motion(self, key, payload):
+        """Sends a motion alert to the owner of the house, if there is one."""
+        houseID = key.house
+        unit_str = f"House {houseID}, F{key.floor}/U{key.unit}"
+
+        # Find the user who owns this house
+        owner_id = None
+        for user_id, owned_house_id in self.ownership_dict.items():
+            if str(owned_house_id) == str(houseID):
+                owner_id = user_id
+                break
+
+        if not owner_id:
+            return # No one owns this house, so no alert to send
+
+        value = payload.get("e", [{}])[0].get("v")
+        if value == "Detected":
+            alert_message = f"🚨 *MOTION ALERT!* 🚨\n\nMotion detected in *{unit_str}*."
+            self.bot.sendMessage(owner_id, alert_message, parse_mode="Markdown")
+
 
     def get_house_data(self):
         try:
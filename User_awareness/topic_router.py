@@ -0,0 +1,114 @@
+# changelog:
+# - 2026-10-19: Created. Trie based topic router shared by all services that consume MQTT messages.
+
+import sys
+from collections import namedtuple
+
+
+class TopicKey(namedtuple("TopicKey", "topic kind house floor unit device")):
+    """
+    Pre-parsed form of a `<project>/<kind>/<house>/<floor>/<unit>/<device>` topic.
+    Numeric IDs are converted to int, missing levels are None.
+    """
+    __slots__ = ()
+
+    @property
+    def unit_key(self):
+        """(house, floor, unit) tuple, the key used for per-unit state."""
+        return (self.house, self.floor, self.unit)
+
+    @property
+    def unit_id(self):
+        """'house-floor-unit' string, the form used by the catalog and the dashboard."""
+        return f"{self.house}-{self.floor}-{self.unit}"
+
+
+def _typed(segment):
+    return int(segment) if segment.isdigit() else segment
+
+
+def parse_topic(topic):
+    """Splits a topic once and returns its TopicKey."""
+    parts = [sys.intern(p) for p in topic.split("/")]
+    levels = parts[1:6] + [None] * (5 - len(parts[1:6]))
+    kind, house, floor, unit, device = levels
+    return TopicKey(
+        topic,
+        kind,
+        _typed(house) if house is not None else None,
+        _typed(floor) if floor is not None else None,
+        _typed(unit) if unit is not None else None,
+        device,
+    ), parts
+
+
+class _Node:
+    __slots__ = ("children", "handlers", "hash_handlers")
+
+    def __init__(self):
+        self.children = {}
+        self.handlers = []       # handlers of patterns ending at this level
+        self.hash_handlers = []  # handlers of patterns ending with '#' below this level
+
+
+class TopicRouter:
+    """
+    Routes messages to handlers registered for MQTT topic patterns ('+' and '#' allowed).
+
+    Patterns are stored in a trie, so matching a topic only walks its levels and
+    never looks at handlers that cannot match. The parsed key and the matching
+    handlers are cached per topic, so a topic is parsed once and repeated
+    messages on it cost a single dict lookup. Handlers are called as
+    handler(key, payload) with a TopicKey.
+    """
+
+    def __init__(self, cache_size=10000):
+        self._root = _Node()
+        self._cache = {}
+        self.cache_size = cache_size
+
+    def add_route(self, pattern, handler):
+        node = self._root
+        levels = pattern.split("/")
+        for i, level in enumerate(levels):
+            if level == "#":
+                if i != len(levels) - 1:
+                    raise ValueError(f"'#' must be the last level of pattern '{pattern}'")
+                node.hash_handlers.append(handler)
+                break
+            node = node.children.setdefault(sys.intern(level), _Node())
+        else:
+            node.handlers.append(handler)
+        self._cache.clear()
+
+    def _collect(self, node, parts, idx, found):
+        found.extend(node.hash_handlers)
+        if idx == len(parts):
+            found.extend(node.handlers)
+            return
+        child = node.children.get(parts[idx])
+        if child is not None:
+            self._collect(child, parts, idx + 1, found)
+        child = node.children.get("+")
+        if child is not None:
+            self._collect(child, parts, idx + 1, found)
+
+    def match(self, topic):
+        """Returns (TopicKey, handlers) for a topic, from the cache when possible."""
+        entry = self._cache.get(topic)
+        if entry is None:
+            key, parts = parse_topic(topic)
+            handlers = []
+            self._collect(self._root, parts, 0, handlers)
+            entry = (key, tuple(handlers))
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[topic] = entry
+        return entry
+
+    def dispatch(self, topic, payload):
+        """Calls every handler matching the topic. Returns how many were called."""
+        key, handlers = self.match(topic)
+        for handler in handlers:
+            handler(key, payload)
+        return len(handlers)
@@ -0,0 +1,83 @@
+# changelog:
+# - 2026-10-19: Created. Differential check and timing of the vectorized rule sweep vs the scalar rules.
+# - 2026-10-19: The reference skips units without a light reading, as the sweep now does.
+#
+# Fills a UnitStateStore with random units (including missing readings, unknown switch states
+# and freed slots), checks that bulk_evaluate() gives exactly the units the compiled default
+# rules would command, then times the NumPy path, the pure-Python fallback and the rules.
+#
+# Usage: python benchmarks/bench_bulk_rules.py [units ...]
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Control_units"))
+from unit_state import UnitStateStore, ReadingsView, DevicesView
+from automation_rules import compile_rules, UnitContext
+from bulk_rules import bulk_evaluate, np
+
+
+def random_store(count, now, seed=1):
+    rng = random.Random(seed)
+    store = UnitStateStore()
+    for i in range(count):
+        slot = store.slot((i // 6 + 1, i % 6 // 3 + 1, i % 3 + 1))
+        if rng.random() < 0.9:
+            # Around the thresholds too, to catch off-by-one comparisons
+            store.set_reading(slot, "light_sensor", rng.choice((rng.uniform(0, 1000), 380.0, 420.0)))
+        if rng.random() < 0.8:
+            store.set_device(slot, "light_switch", rng.choice(("ON", "OFF", "DISABLE")))
+        if rng.random() < 0.7:
+            store.last_motion[slot] = now - rng.choice((rng.uniform(0, 60), 30.0))
+    for i in range(0, count, 97):
+        store.export((i // 6 + 1, i % 6 // 3 + 1, i % 3 + 1))
+    return store
+
+
+def scalar_reference(store, now):
+    """
+    What the event-driven path decides for each unit on a light reading, using
+    the compiled default rules. Units without a reading are skipped, as in the sweep.
+    """
+    rules = compile_rules(None)
+    on, off = [], []
+    for slot, key in enumerate(store.keys):
+        if key is None or store.reading(slot, "light_sensor") is None:
+            continue
+        ctx = UnitContext(ReadingsView(store, slot), DevicesView(store, slot), store.last_motion[slot], None, now)
+        for rule in rules.evaluate("light_sensor", ctx):
+            (on if rule.command == "ON" else off).append(slot)
+    return on, off
+
+
+def timed(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    if np is None:
+        print("NumPy is not installed: only the pure-Python fallback is measured")
+    print(f"{'units':>9}{'ON':>8}{'OFF':>8}{'rules ms':>11}{'python ms':>11}{'numpy ms':>10}")
+    for count in sizes:
+        now = time.time()
+        store = random_store(count, now)
+
+        (ref_on, ref_off), rules_time = timed(scalar_reference, store, now, repeat=1)
+        (py_on, py_off), python_time = timed(bulk_evaluate, store, now, False)
+        assert (py_on, py_off) == (ref_on, ref_off), "pure-Python sweep differs from the rules"
+        numpy_ms = "-"
+        if np is not None:
+            (np_on, np_off), numpy_time = timed(bulk_evaluate, store, now)
+            assert (np_on.tolist(), np_off.tolist()) == (ref_on, ref_off), "NumPy sweep differs from the rules"
+            numpy_ms = f"{numpy_time * 1000:.1f}"
+
+        print(f"{count:>9}{len(ref_on):>8}{len(ref_off):>8}{rules_time * 1000:>11.1f}"
+              f"{python_time * 1000:>11.1f}{numpy_ms:>10}")
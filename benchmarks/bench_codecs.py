@@ -0,0 +1,57 @@
+# changelog:
+# - 2026-10-19: Created. Bytes per message and encode/decode time of every installed payload codec.
+#
+# Usage: python benchmarks/bench_codecs.py [iterations]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Control_units"))
+from senml_codec import CODECS
+
+
+def sample_messages():
+    """The three message shapes that travel on the bus: light reading, motion reading and command."""
+    now = str(time.time())
+    return [
+        {"bn": "ThiefDetector/sensors/1/2/1/light_sensor",
+         "e": [{"n": "light", "u": "lux", "t": now, "v": 412.37}]},
+        {"bn": "ThiefDetector/sensors/1/2/1/motion_sensor",
+         "e": [{"n": "motion", "u": "status", "t": now, "v": "Detected"}]},
+        {"bn": "ThiefDetector/commands/1/2/1/light_switch",
+         "e": [{"n": "actuator", "u": "command", "t": now, "v": "ON"}]},
+    ]
+
+
+def bench(codec, messages, iterations):
+    encoded = [codec.encode(msg) for msg in messages]
+    for msg, data in zip(messages, encoded):
+        assert codec.decode(data) == msg, f"{codec.name} does not round-trip {msg}"
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for msg in messages:
+            codec.encode(msg)
+    encode_us = (time.perf_counter() - start) / (iterations * len(messages)) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for data in encoded:
+            codec.decode(data)
+    decode_us = (time.perf_counter() - start) / (iterations * len(messages)) * 1e6
+
+    avg_bytes = sum(len(data) for data in encoded) / len(encoded)
+    return avg_bytes, encode_us, decode_us
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    messages = sample_messages()
+    print(f"{'codec':<10}{'bytes/msg':>12}{'encode us':>12}{'decode us':>12}")
+    for name, codec in CODECS.items():
+        avg_bytes, encode_us, decode_us = bench(codec, messages, iterations)
+        print(f"{name:<10}{avg_bytes:>12.1f}{encode_us:>12.2f}{decode_us:>12.2f}")
+    missing = {"json", "cbor", "msgpack"} - set(CODECS)
+    if missing:
+        print(f"Not installed: {', '.join(sorted(missing))}")
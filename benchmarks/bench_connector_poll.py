@@ -0,0 +1,83 @@
+# changelog:
+# - 2026-10-19: Created. Dashboard refresh time with ConnectorPoller vs the old sequential fan-out.
+#
+# Serves `units` fake connectors from a local HTTP server that answers after `delay` seconds.
+# A few connectors hang and a few refuse connections. Prints the time of a sequential
+# refresh (the old fetch_unit_devices loop), then of cold, cached and breaker-open refreshes
+# with the poller.
+#
+# Usage: python benchmarks/bench_connector_poll.py [units] [delay s]
+
+import os
+import sys
+import json
+import time
+import threading
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "User_awareness"))
+from connector_poller import ConnectorPoller
+
+HANGING_EVERY, DEAD_EVERY = 50, 40
+
+
+def start_server(delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            unit = int(self.path.split("/")[1].split("_")[1])
+            time.sleep(30 if unit % HANGING_EVERY == 0 else delay)
+            data = json.dumps([{"deviceName": "light_switch", "deviceStatus": "ON"}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def unit_urls(port, units):
+    # Port 9 (discard) refuses connections: a dead connector
+    return [f"http://127.0.0.1:{9 if u % DEAD_EVERY == 0 else port}/unit_{u}" for u in range(1, units + 1)]
+
+
+def sequential(urls, timeout):
+    for url in urls:
+        try:
+            requests.get(f"{url}/devices", timeout=timeout).json()
+        except requests.exceptions.RequestException:
+            pass
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    units = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    server = start_server(delay)
+    urls = unit_urls(server.server_address[1], units)
+
+    healthy = [url for i, url in enumerate(urls, 1) if i % HANGING_EVERY and i % DEAD_EVERY]
+    print(f"units={units} delay={delay}s hanging={units // HANGING_EVERY} dead={units // DEAD_EVERY}")
+    print(f"sequential, healthy units only: {timed(sequential, healthy, 3.0):.2f}s")
+
+    poller = ConnectorPoller(workers=32, ttl=2.0, timeout=1.0, failure_threshold=1, open_for=30.0)
+    print(f"poller cold:   {timed(poller.fetch_many, urls):.2f}s")
+    print(f"poller cached: {timed(poller.fetch_many, urls):.4f}s")
+    time.sleep(2.1)
+    print(f"poller after TTL, breakers open: {timed(poller.fetch_many, urls):.2f}s")
+    print(poller.get_stats())
+    os._exit(0)
@@ -0,0 +1,146 @@
+# changelog:
+# - 2026-10-19: Created. Sensor -> control unit -> actuator pipeline on the in-process broker.
+# - 2026-10-19: Controllers share the timer service, catalog writer and command pipeline, as in CU_instancer.
+#
+# Runs simulated sensor publishers, the control-unit dispatch path (TopicRouter + Controler)
+# and an actuator subscriber in one process, connected through LocalBroker, and reports
+# throughput and sensor-to-controller latency. The catalog is not involved.
+#
+# Usage: python benchmarks/bench_pipeline.py [units] [messages_per_unit] [dispatch_workers]
+
+import os
+import sys
+import io
+import time
+import random
+import threading
+import contextlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "Control_units"))
+sys.path.insert(0, HERE)
+
+from local_broker import LocalBroker
+from MyMQTT2 import MyMQTT
+from topic_router import TopicRouter
+from control_unit import Controler
+from device_directory import DeviceDirectory
+from catalog_writer import CatalogStatusWriter
+from timer_service import TimerService
+from command_pipeline import CommandPipeline
+
+MAIN_TOPIC = "ThiefDetector"
+
+
+class OfflineControler(Controler):
+    """Controler with the catalog write replaced by a cache update, so only the MQTT path is measured."""
+
+    def update_catalog(self, key, device_name, new_status, reason):
+        self.state.set_device(self.state.slot(key), device_name, new_status)
+
+
+class BenchInstancer:
+    """The dispatch part of CU_instancer: route sensor topics to the controller owning the unit."""
+
+    def __init__(self, broker, units, units_per_controller, dispatch_workers):
+        self.router = TopicRouter()
+        self.router.add_route(f"{MAIN_TOPIC}/sensors/+/+/+/+", self.on_sensor_message)
+        self.client = MyMQTT("bench_cu", broker, 1883, self, dispatch_workers=dispatch_workers)
+        self.controllers = {}
+        self.unit_assignment = {}
+        directory = DeviceDirectory("http://catalog.invalid")
+        self.writer = CatalogStatusWriter("http://catalog.invalid", directory)
+        self.timers = TimerService()
+        self.commands = CommandPipeline(self.timers)
+        for idx, unit in enumerate(units):
+            name = f"controller_{idx // units_per_controller}"
+            if name not in self.controllers:
+                self.controllers[name] = OfflineControler("http://catalog.invalid", self.client, MAIN_TOPIC,
+                                                          directory, self.writer, self.timers, self.commands)
+            self.unit_assignment["-".join(str(p) for p in unit)] = name
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.expected = 0
+
+    def notify(self, topic, payload):
+        self.router.dispatch(topic, payload)
+
+    def on_sensor_message(self, key, payload):
+        self.controllers[self.unit_assignment[key.unit_id]].process_message(key, payload)
+        latency = time.time() - float(payload["e"][0]["t"])
+        with self.lock:
+            self.latencies.append(latency)
+            if len(self.latencies) >= self.expected:
+                self.done.set()
+
+
+class CommandCounter:
+    def __init__(self):
+        self.count = 0
+
+    def notify(self, topic, payload):
+        self.count += 1
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(num_units, messages_per_unit, dispatch_workers, seed=1):
+    random.seed(seed)
+    broker = LocalBroker(synchronous=True)
+    units = [(h, f, u) for h in range(1, 1000) for f in (1, 2) for u in (1, 2, 3)][:num_units]
+
+    instancer = BenchInstancer(broker, units, 5, dispatch_workers)
+    instancer.expected = num_units * messages_per_unit
+    instancer.client.start()
+    instancer.client.mySubscribe(f"{MAIN_TOPIC}/sensors/#")
+
+    actuators = CommandCounter()
+    actuator_client = MyMQTT("bench_actuators", broker, 1883, actuators)
+    actuator_client.start()
+    actuator_client.mySubscribe(f"{MAIN_TOPIC}/commands/#")
+
+    sensors = MyMQTT("bench_sensors", broker, 1883, None)
+    sensors.start()
+
+    start = time.perf_counter()
+    for _ in range(messages_per_unit):
+        for house, floor, unit in units:
+            if random.random() < 0.2:
+                topic = f"{MAIN_TOPIC}/sensors/{house}/{floor}/{unit}/motion_sensor"
+                event = {"n": "motion", "u": "status", "t": str(time.time()), "v": "Detected"}
+            else:
+                topic = f"{MAIN_TOPIC}/sensors/{house}/{floor}/{unit}/light_sensor"
+                event = {"n": "light", "u": "lux", "t": str(time.time()), "v": round(random.uniform(0, 1000), 2)}
+            sensors.myPublish(topic, {"bn": topic, "e": [event]})
+    instancer.done.wait(timeout=120)
+    elapsed = time.perf_counter() - start
+
+    for client in (sensors, actuator_client, instancer.client):
+        client.stop()
+    instancer.timers.stop()
+    instancer.writer.stop()
+    return {
+        "messages": len(instancer.latencies),
+        "commands": actuators.count,
+        "suppressed": instancer.commands.get_stats()["suppressed"],
+        "throughput": len(instancer.latencies) / elapsed,
+        "p50_ms": percentile(instancer.latencies, 50) * 1000,
+        "p99_ms": percentile(instancer.latencies, 99) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    num_units = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    messages_per_unit = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    dispatch_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    # The services log every message; keep that out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run(num_units, messages_per_unit, dispatch_workers)
+    print(f"units={num_units} messages={result['messages']} commands={result['commands']} "
+          f"suppressed={result['suppressed']} dispatch_workers={dispatch_workers}")
+    print(f"throughput={result['throughput']:.0f} msg/s  p50={result['p50_ms']:.2f} ms  p99={result['p99_ms']:.2f} ms")
@@ -0,0 +1,59 @@
+# changelog:
+# - 2026-10-19: Created. Runs the ThingSpeak ChannelUploader against the local stand-in, with failures.
+# - 2026-10-19: The uploader is restarted on the same outbox in the middle of an outage.
+#
+# Several channels receive entries while the stand-in answers 500 and 429 for a while. Halfway
+# through, the stand-in goes down and the uploader is restarted on the same outbox file. Checks
+# that every entry arrives once and in order, and prints the number of requests it took.
+#
+# Usage: python benchmarks/bench_thingspeak.py [channels] [entries per channel] [interval s]
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ThingSpeak"))
+from channel_uploader import ChannelUploader
+from local_thingspeak import LocalThingSpeak
+
+
+if __name__ == "__main__":
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    per_channel = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    interval = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+
+    outbox = os.path.join(tempfile.mkdtemp(), "outbox.db")
+    api_keys = {str(c): f"key{c}" for c in range(channels)}
+    server = LocalThingSpeak(min_interval=interval)
+    uploader = ChannelUploader(server.url, update_interval=interval, outbox_path=outbox)
+    uploader.set_channels(api_keys)
+
+    start = time.time()
+    for i in range(per_channel):
+        if i == per_channel // 3:
+            server.fail_next = channels * 2
+        if i == per_channel // 2:
+            # Outage: nothing is accepted while the uploader restarts on the same outbox
+            server.fail_next = 10 ** 9
+            uploader.stop()
+            uploader = ChannelUploader(server.url, update_interval=interval, outbox_path=outbox)
+            uploader.set_channels(api_keys)
+        if i == per_channel * 3 // 4:
+            server.fail_next = 0
+        for c in range(channels):
+            uploader.submit(str(c), {"created_at": i, "field1": i % 2})
+        time.sleep(interval * 10 / per_channel)
+
+    while uploader.get_stats()["pending"] and time.time() - start < 60:
+        time.sleep(interval / 4)
+    elapsed = time.time() - start
+    stats = uploader.get_stats()
+    uploader.stop()
+    server.stop()
+
+    for c in range(channels):
+        got = [entry["created_at"] for entry in server.entries.get(str(c), [])]
+        assert got == list(range(per_channel)), f"channel {c}: entries lost, duplicated or out of order"
+    print(f"channels={channels} entries={channels * per_channel} elapsed={elapsed:.1f}s "
+          f"requests={server.requests} rate_limited={stats['rate_limited']} retries={stats['retries']}")
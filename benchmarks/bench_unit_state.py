@@ -0,0 +1,108 @@
+# changelog:
+# - 2026-10-19: Created. Memory and sweep time of the old dict-based unit state vs UnitStateStore.
+#
+# Usage: python benchmarks/bench_unit_state.py [units ...]
+
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Control_units"))
+from unit_state import UnitStateStore, SWITCH_CODES
+
+ON_BELOW, OFF_ABOVE, MOTION_TIMEOUT = 380, 420, 30
+
+
+def unit_keys(count):
+    return [(h, f, u) for h in range(1, count // 6 + 2) for f in (1, 2) for u in (1, 2, 3)][:count]
+
+
+def sample_values(count, seed=1):
+    rng = random.Random(seed)
+    now = time.time()
+    return [(rng.uniform(0, 1000), now - rng.uniform(0, 120), rng.choice(("ON", "OFF"))) for _ in range(count)]
+
+
+def build_dicts(keys, values):
+    """The layout the Controler used: three dicts keyed by unit tuple, device status nested per unit."""
+    latest_light_level, last_motion_time, device_status_cache = {}, {}, {}
+    for key, (light, motion, switch) in zip(keys, values):
+        latest_light_level[key] = light
+        last_motion_time[key] = motion
+        device_status_cache[key] = {"light_switch": switch}
+    return latest_light_level, last_motion_time, device_status_cache
+
+
+def build_store(keys, values):
+    store = UnitStateStore()
+    for key, (light, motion, switch) in zip(keys, values):
+        slot = store.slot(key)
+        store.set_reading(slot, "light_sensor", light)
+        store.last_motion[slot] = motion
+        store.set_device(slot, "light_switch", switch)
+    return store
+
+
+def sweep_dicts(state, now):
+    latest_light_level, last_motion_time, device_status_cache = state
+    on, off = [], []
+    for key in latest_light_level:
+        light = latest_light_level[key]
+        is_on = device_status_cache.get(key, {}).get("light_switch") == "ON"
+        if not is_on and light < ON_BELOW:
+            on.append(key)
+        elif is_on and light > OFF_ABOVE and now - last_motion_time.get(key, 0) >= MOTION_TIMEOUT:
+            off.append(key)
+    return on, off
+
+
+def sweep_store(store, now):
+    on, off = [], []
+    switch_on = SWITCH_CODES["ON"]
+    keys = store.keys
+    for slot, (light, motion, switch) in enumerate(zip(store.light, store.last_motion, store.switch)):
+        if keys[slot] is None:
+            continue
+        if switch != switch_on and light < ON_BELOW:
+            on.append(keys[slot])
+        elif switch == switch_on and light > OFF_ABOVE and now - motion >= MOTION_TIMEOUT:
+            off.append(keys[slot])
+    return on, off
+
+
+def measure(build, keys, values):
+    tracemalloc.start()
+    state = build(keys, values)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return state, size
+
+
+def timed(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    print(f"{'units':>9}{'layout':>8}{'bytes/unit':>12}{'sweep ms':>10}")
+    for count in sizes:
+        keys = unit_keys(count)
+        values = sample_values(count)
+        # The keys are shared by both layouts and not counted
+        dicts, dict_bytes = measure(build_dicts, keys, values)
+        store, store_bytes = measure(build_store, keys, values)
+
+        now = time.time()
+        dict_result, dict_time = timed(sweep_dicts, dicts, now)
+        store_result, store_time = timed(sweep_store, store, now)
+        assert dict_result == store_result, "the two layouts disagree"
+
+        print(f"{count:>9}{'dicts':>8}{dict_bytes / count:>12.0f}{dict_time * 1000:>10.1f}")
+        print(f"{count:>9}{'store':>8}{store_bytes / count:>12.0f}{store_time * 1000:>10.1f}")
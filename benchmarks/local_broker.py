@@ -0,0 +1,248 @@
+# changelog:
+# - 2026-10-19: Created. In-process MQTT broker stand-in for offline tests and benchmarks.
+
+import threading
+import collections
+from paho.mqtt.client import topic_matches_sub
+
+
+class LocalMessage:
+    """Same attributes as paho's MQTTMessage."""
+    __slots__ = ("topic", "payload", "qos", "retain", "mid", "properties")
+
+    def __init__(self, topic, payload, qos, retain, mid):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+        self.properties = None
+
+
+class LocalMessageInfo:
+    """Same interface as paho's MQTTMessageInfo. Delivery is complete when publish() returns."""
+
+    def __init__(self, mid, rc=0):
+        self.mid = mid
+        self.rc = rc
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return self.rc == 0
+
+
+class LocalBroker:
+    """
+    Enough of an MQTT 3.1.1 broker to run the services in one process:
+    connect/disconnect with last will, subscribe with '+'/'#' wildcards,
+    publish with QoS 0 and 1 (QoS 2 requests are granted QoS 1) and retained
+    messages. Pass an instance as the `broker` argument of MyMQTT.
+
+    With synchronous=True a publish is delivered to every subscriber before
+    publish() returns, which makes benchmark runs deterministic. Otherwise each
+    client gets its own delivery thread, like paho's network loop.
+    """
+    MAX_QOS = 1
+
+    def __init__(self, synchronous=True):
+        self.synchronous = synchronous
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.retained = {}
+        self.online = True
+        self._mid = 0
+        self.stats = {"published": 0, "delivered": 0}
+
+    def __str__(self):
+        return "local-broker"
+
+    def create_client(self, client_id, **kwargs):
+        return LocalClient(self, client_id)
+
+    def next_mid(self):
+        with self.lock:
+            self._mid += 1
+            return self._mid
+
+    def connect(self, client):
+        with self.lock:
+            if not self.online:
+                raise ConnectionRefusedError("local broker is down")
+            old = self.clients.get(client.client_id)
+            self.clients[client.client_id] = client
+        if old is not None and old is not client:
+            old._dropped(rc=7)
+        client._connected(rc=0)
+
+    def disconnect(self, client, clean=True):
+        with self.lock:
+            if self.clients.get(client.client_id) is client:
+                del self.clients[client.client_id]
+            will = client.will
+        if not clean and will is not None:
+            self.publish(*will)
+
+    def subscribe(self, client, pattern, qos):
+        granted = min(qos, self.MAX_QOS)
+        with self.lock:
+            client.subscriptions[pattern] = granted
+            retained = [(t, m) for t, m in self.retained.items() if topic_matches_sub(pattern, t)]
+        for topic, (payload, msg_qos) in retained:
+            client._deliver(LocalMessage(topic, payload, min(msg_qos, granted), True, self.next_mid()))
+        return granted
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        elif payload is None:
+            payload = b""
+        qos = min(qos, self.MAX_QOS)
+        with self.lock:
+            if retain:
+                if payload:
+                    self.retained[topic] = (payload, qos)
+                else:
+                    self.retained.pop(topic, None)
+            targets = []
+            for client in self.clients.values():
+                granted = [q for pattern, q in client.subscriptions.items() if topic_matches_sub(pattern, topic)]
+                if granted:
+                    targets.append((client, min(qos, max(granted))))
+            self.stats["published"] += 1
+            self.stats["delivered"] += len(targets)
+        for client, deliver_qos in targets:
+            client._deliver(LocalMessage(topic, payload, deliver_qos, False, self.next_mid()))
+
+    def go_offline(self):
+        """Simulates a broker restart: every client is disconnected and new connections are refused."""
+        with self.lock:
+            self.online = False
+            clients = list(self.clients.values())
+            self.clients.clear()
+        for client in clients:
+            client._dropped(rc=1)
+
+    def go_online(self):
+        """Ends the outage and reconnects the clients that are still running their loop."""
+        with self.lock:
+            self.online = True
+        for client in list(LocalClient.instances):
+            if client.broker is self and client.wants_connection:
+                self.connect(client)
+
+
+class LocalClient:
+    """The subset of paho.mqtt.client.Client used by MyMQTT, backed by a LocalBroker."""
+    instances = set()
+
+    def __init__(self, broker, client_id):
+        self.broker = broker
+        self.client_id = client_id
+        self.subscriptions = {}
+        self.will = None
+        self.is_connected = False
+        self.wants_connection = False
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self._inbox = collections.deque()
+        self._inbox_ready = threading.Condition()
+        self._loop_thread = None
+        self._loop_running = False
+        LocalClient.instances.add(self)
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def will_set(self, topic, payload=None, qos=0, retain=False):
+        self.will = (topic, payload, qos, retain)
+
+    def connect(self, host=None, port=None, *args, **kwargs):
+        self.wants_connection = True
+        self.broker.connect(self)
+        return 0
+
+    def connect_async(self, host=None, port=None, *args, **kwargs):
+        self.wants_connection = True
+        if self.broker.online:
+            self.broker.connect(self)
+        return 0
+
+    def loop_start(self):
+        if self.broker.synchronous or self._loop_thread is not None:
+            return
+        self._loop_running = True
+        self._loop_thread = threading.Thread(target=self._loop, daemon=True)
+        self._loop_thread.start()
+
+    def loop_stop(self):
+        self._loop_running = False
+        with self._inbox_ready:
+            self._inbox_ready.notify_all()
+        if self._loop_thread is not None:
+            self._loop_thread.join()
+            self._loop_thread = None
+
+    def disconnect(self):
+        self.wants_connection = False
+        if self.is_connected:
+            self.broker.disconnect(self, clean=True)
+            self._dropped(rc=0)
+        return 0
+
+    def kill(self):
+        """Simulates a crash: the broker publishes the last will."""
+        self.wants_connection = False
+        if self.is_connected:
+            self.broker.disconnect(self, clean=False)
+            self._dropped(rc=1)
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        mid = self.broker.next_mid()
+        if not self.is_connected:
+            return LocalMessageInfo(mid, rc=4)  # MQTT_ERR_NO_CONN
+        self.broker.publish(topic, payload, qos, retain)
+        return LocalMessageInfo(mid)
+
+    def subscribe(self, topic, qos=0):
+        if not self.is_connected:
+            return (4, None)
+        self.broker.subscribe(self, topic, qos)
+        return (0, self.broker.next_mid())
+
+    def unsubscribe(self, topic):
+        self.subscriptions.pop(topic, None)
+        return (0, self.broker.next_mid())
+
+    def _connected(self, rc):
+        self.is_connected = True
+        if self.on_connect:
+            self.on_connect(self, None, {"session present": 0}, rc)
+
+    def _dropped(self, rc):
+        was_connected = self.is_connected
+        self.is_connected = False
+        if was_connected and self.on_disconnect:
+            self.on_disconnect(self, None, rc)
+
+    def _deliver(self, msg):
+        if self.broker.synchronous or self._loop_thread is None:
+            if self.on_message:
+                self.on_message(self, None, msg)
+            return
+        with self._inbox_ready:
+            self._inbox.append(msg)
+            self._inbox_ready.notify()
+
+    def _loop(self):
+        while True:
+            with self._inbox_ready:
+                while not self._inbox and self._loop_running:
+                    self._inbox_ready.wait()
+                if not self._inbox:
+                    return
+                msg = self._inbox.popleft()
+            if self.on_message:
+                self.on_message(self, None, msg)
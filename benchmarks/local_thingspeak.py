@@ -0,0 +1,78 @@
+# changelog:
+# - 2026-10-19: Created. Local HTTP stand-in for the ThingSpeak bulk-update API.
+
+import json
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BULK_PATH = re.compile(r"^/channels/([^/]+)/bulk_update\.json$")
+
+
+class LocalThingSpeak:
+    """
+    Accepts POST /channels/<id>/bulk_update.json like ThingSpeak: answers 429
+    when a channel is written again within `min_interval` seconds, and the next
+    `fail_next` requests get a 500. Accepted entries are kept in `entries[channel]`.
+
+        server = LocalThingSpeak(min_interval=0.2)
+        uploader = ChannelUploader(server.url, update_interval=0.2)
+    """
+
+    def __init__(self, min_interval=15.0, port=0):
+        self.min_interval = min_interval
+        self.fail_next = 0
+        self.entries = {}
+        self.last_write = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _answer(self, channel, body):
+        with self.lock:
+            self.requests += 1
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return 500, {"error": "unavailable"}
+            now = time.time()
+            if now - self.last_write.get(channel, 0) < self.min_interval:
+                return 429, {"error": "rate limited"}
+            updates = body.get("updates")
+            if not isinstance(updates, list) or not body.get("write_api_key"):
+                return 400, {"error": "bad request"}
+            self.last_write[channel] = now
+            self.entries.setdefault(channel, []).extend(updates)
+            return 202, {"success": True}
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                match = BULK_PATH.match(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    body = {}
+                status, answer = stand_in._answer(match.group(1), body) if match else (404, {"error": "not found"})
+                data = json.dumps(answer).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
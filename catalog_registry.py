@@ -2,6 +2,12 @@
 # - 2025-07-16: Added schema-based validation for new devices and houses.
 # - 2025-07-16: Integrated validation into POST and PUT methods.
 # - 2025-07-16: Enforced consistent string-based handling for IDs.
+# - 2026-10-19: Added PATCH /devices/{id} to update only the status fields of one device.
+# - 2026-10-19: Devices are indexed by ID for lookups.
+# - 2026-10-19: PATCH /devices accepts a list of device updates and saves the catalog once.
+# - 2026-10-19: Houses may carry an optional automationRules list.
+# - 2026-10-19: Houses may carry an optional thingSpeak channel/field mapping, read by the ThingSpeak adaptor.
+# - 2026-10-19: PATCH /devices answers 400 on invalid updates and 404 on unknown devices instead of 200.
 
 import cherrypy
 import json
@@ -22,11 +28,19 @@ DEVICE_SCHEMA = {
     "servicesDetails": {"type": list, "required": True},
 }
 
+# Fields a PATCH may change on an existing device
+DEVICE_PATCH_SCHEMA = {
+    "deviceStatus": {"type": str, "required": False},
+    "lastCommandReason": {"type": str, "required": False},
+}
+
 # Schema for validating a new house
 HOUSE_SCHEMA = {
     "houseID": {"type": str, "required": True},
     "houseName": {"type": str, "required": True},
     "floors": {"type": list, "required": True},
+    "automationRules": {"type": list, "required": False},
+    "thingSpeak": {"type": dict, "required": False},
 }
 
 class WebCatalogThiefDetector():
@@ -62,6 +76,18 @@ class WebCatalogThiefDetector():
 
         return errors
 
+    def patch_errors(self, changes):
+        if not isinstance(changes, dict):
+            return ["Body must be a JSON object"]
+        errors = self.validate_payload(changes, DEVICE_PATCH_SCHEMA)
+        errors += [f"Field '{field}' cannot be patched" for field in changes if field not in DEVICE_PATCH_SCHEMA]
+        return errors
+
+    def patch_device(self, device, changes, now):
+        device.update(changes)
+        device["lastUpdate"] = now
+        self.catalog["lastUpdate"] = now
+
     @cherrypy.tools.json_out()
     def GET(self, *uri, **params):
         if len(uri) == 0:
@@ -230,6 +256,59 @@ class WebCatalogThiefDetector():
         else:
             return "Invalid path. Use /houses or /devices to update items."
 
+    @cherrypy.tools.json_out()
+    @cherrypy.tools.json_in()
+    def PATCH(self, *uri, **params):
+        if len(uri) == 0 or uri[0].lower() != "devices":
+            return "Use /devices/{id} to update the status of one device, or /devices with a list to update many."
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # Batch: [{"deviceID": ..., "deviceStatus": ..., "lastCommandReason": ...}, ...], saved once
+        if len(uri) == 1:
+            updates = cherrypy.request.json
+            if not isinstance(updates, list):
+                cherrypy.response.status = 400
+                return {"errors": ["Body must be a JSON list of device updates"]}
+            result = {"updated": 0, "notFound": [], "errors": []}
+            for update in updates:
+                changes = dict(update) if isinstance(update, dict) else update
+                deviceID = changes.pop("deviceID", None) if isinstance(changes, dict) else None
+                errors = self.patch_errors(changes)
+                if deviceID is None:
+                    errors.append("Missing required field: 'deviceID'")
+                if errors:
+                    result["errors"].append({"deviceID": deviceID, "errors": errors})
+                    continue
+                device = self.get_device_by_id(deviceID)
+                if not device:
+                    result["notFound"].append(deviceID)
+                    continue
+                self.patch_device(device, changes, now)
+                result["updated"] += 1
+            if result["updated"]:
+                self.save_catalog()
+            elif result["errors"]:
+                cherrypy.response.status = 400
+            elif result["notFound"]:
+                cherrypy.response.status = 404
+            return result
+
+        changes = cherrypy.request.json
+        errors = self.patch_errors(changes)
+        if errors:
+            cherrypy.response.status = 400
+            return {"errors": errors}
+
+        deviceID = uri[1]
+        device = self.get_device_by_id(deviceID)
+        if not device:
+            cherrypy.response.status = 404
+            return f"No device found with ID {deviceID}"
+
+        self.patch_device(device, changes, now)
+        self.save_catalog()
+        return "Device updated successfully"
+
     @cherrypy.tools.json_out()
     @cherrypy.tools.json_in()
     def DELETE(self, *uri, **params):
@@ -262,11 +341,13 @@ class WebCatalogThiefDetector():
 
     def deviceGetter(self):
         self.devices = []
+        self.devices_by_id = {}
         for house in self.housesList:
             for floorObj in house.get("floors", []):
                 for unitObj in floorObj.get("units", []):
                     for device in unitObj["devicesList"]:
                         self.devices.append(device)
+                        self.devices_by_id[str(device["deviceID"])] = device
 
     def get_house_by_id(self, houseID):
         return next((h for h in self.housesList if str(h["houseID"]) == str(houseID)), None)
@@ -284,10 +365,7 @@ class WebCatalogThiefDetector():
         return None
 
     def get_device_by_id(self, deviceID):
-        for d in self.devices:
-            if str(d["deviceID"]) == str(deviceID):
-                return d
-        return None
+        return self.devices_by_id.get(str(deviceID))
 
     def periodic_cleanup(self):
         THRESHOLD = 1